@@ -2,6 +2,10 @@ from reconchess import *
 import chess.engine
 import random
 from collections import Counter
+from king_danger import decisive_move
+from functools import partial
+from belief import update_belief, opponent_move_successors, apply_move_feedback, apply_own_capture, SenseObservation, filter_sense
+from engines import open_engine
 
 
 class ImprovedAgent(Player):
@@ -12,7 +16,9 @@ class ImprovedAgent(Player):
         self.my_piece_captured_square = None
         self.count = None
         self.possible_states = set()
-        self.engine = chess.engine.SimpleEngine.popen_uci('./opt/stockfish/stockfish', setpgrp=True)
+        self.max_states = 10000  # Limit the number of states to consider
+        self.decisive_threshold = 0.5
+        self.engine = open_engine()
 
     def handle_game_start(self, color, board, opponent_name):
         self.board = board
@@ -20,16 +26,18 @@ class ImprovedAgent(Player):
         self.color = color
         self.opponent = opponent_name
         self.possible_states = {board.fen()}
+        self.opponent_moved = color == chess.BLACK
 
     def handle_opponent_move_result(self, captured_my_piece, capture_square):
         self.my_piece_captured_square = capture_square
         if captured_my_piece:
             self.board.remove_piece_at(capture_square)
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
-        else:
-            self.possible_states = [next_state for state in self.possible_states for next_state in
-                                    nextStatePrediction(state)]
+        if not self.opponent_moved:
+            self.opponent_moved = True
+            return
+        self.possible_states = update_belief(self.possible_states,
+                                             partial(opponent_move_successors, capture_square=capture_square),
+                                             cap=self.max_states)
 
     def choose_sense(self, sense_actions, move_actions, seconds_left):
         valid_sense_actions = [square for square in sense_actions if square not in chess.SquareSet(
@@ -72,9 +80,7 @@ class ImprovedAgent(Player):
         for square, piece in sense_result:
             self.board.set_piece_at(square, piece)
 
-        window = ";".join(
-            [f"{chess.SQUARE_NAMES[square]}:{piece.symbol() if piece else '?'}" for square, piece in sense_result])
-        self.possible_states = [state for fen in self.possible_states for state in nextStateWithSense(fen, window)]
+        self.possible_states = filter_sense(self.possible_states, SenseObservation(sense_result))
 
     def select_common_move(self, move_actions):
         move_counter = Counter()
@@ -121,18 +127,13 @@ class ImprovedAgent(Player):
         return None
 
     def choose_move(self, move_actions, seconds_left):
-        enemy_king_square = self.board.king(not self.color)
-        if enemy_king_square:
-            enemy_king_attackers = self.board.attackers(self.color, enemy_king_square)
-            if enemy_king_attackers:
-                attacker_square = enemy_king_attackers.pop()
-                move = chess.Move(attacker_square, enemy_king_square)
-                if self.board.is_legal(move):
-                    return move
+        move, reason = decisive_move(self.possible_states or [self.board.fen()], self.color, move_actions,
+                                     self.decisive_threshold)
+        if move is not None:
+            return move
 
-        max_states = 10000  # Limit the number of states to consider
-        if len(self.possible_states) > max_states:
-            self.possible_states = random.sample(self.possible_states, max_states)
+        if len(self.possible_states) > self.max_states:
+            self.possible_states = random.sample(self.possible_states, self.max_states)
 
         move_scores = {}
 
@@ -201,13 +202,9 @@ class ImprovedAgent(Player):
         if taken_move is not None:
             self.board.push(taken_move)
         if captured_opponent_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
+            self.possible_states = apply_own_capture(self.possible_states, taken_move, capture_square)
         else:
-            if taken_move:
-                self.possible_states = [execute_move(state, taken_move.uci()) for state in self.possible_states]
-            else:
-                self.possible_states = [state for state in self.possible_states if state == self.board.fen()]
+            self.possible_states = apply_move_feedback(self.possible_states, requested_move, taken_move, capture_square)
 
     def handle_game_end(self, winner_color, win_reason, game_history):
         self.engine.quit()
@@ -217,57 +214,3 @@ class ImprovedAgent(Player):
             print("Game Over. It was a draw.")
         else:
             print("Game Over. Improved lost.")
-
-
-def nextStatePrediction(fen):
-    board = chess.Board(fen)
-    next_positions = []
-
-    for move in board.legal_moves:
-        temp_board = board.copy()
-        temp_board.push(move)
-        next_positions.append(temp_board.fen())
-
-    next_positions.sort()
-    return next_positions
-
-
-def nextStateWithSense(fen, window):
-    board = chess.Board(fen)
-    for square_name, piece_symbol in (item.split(':') for item in window.split(';')):
-        square = chess.parse_square(square_name)
-        if piece_symbol == '?':
-            if board.piece_at(square) is not None:
-                return {fen}
-        else:
-            piece = chess.Piece.from_symbol(piece_symbol)
-            if board.piece_at(square) != piece:
-                return {}
-    return {fen}
-
-
-def predict_next_states_with_captures(fen_list, capture_square):
-    capture_moves = set()
-    for fen in fen_list:
-        board = chess.Board(fen)
-        try:
-            capture_square_index = chess.parse_square(capture_square)
-            for move in board.generate_legal_captures():
-                if move.to_square == capture_square_index and board.is_capture(move):
-                    board.push(move)
-                    capture_moves.add(board.fen())
-                    board.pop()
-        except ValueError:
-            pass
-
-    return capture_moves
-
-
-def execute_move(fen, move):
-    board = chess.Board(fen)
-    chess_move = chess.Move.from_uci(move)
-    if chess_move in board.legal_moves:
-        board.push(chess_move)
-        return board.fen()
-    else:
-        return fen
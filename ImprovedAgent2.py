@@ -1,4 +1,6 @@
 import logging
+import os
+import time
 from reconchess import Player
 import chess.engine
 import random
@@ -6,6 +8,19 @@ from collections import Counter
 import chess
 import concurrent.futures
 from threading import Lock
+import numpy as np
+from functools import partial
+from belief import BoardPool, SenseObservation, filter_sense, update_belief, opponent_move_successors, sense_consistent_successors, apply_move_feedback, apply_own_capture
+from opponent_model import OpponentModel
+from king_danger import decisive_move, state_codes
+from learned_eval import Evaluator, score_moves
+from clustering import candidate_moves, relevant_squares, cluster_states
+from ponder import Ponderer, expected_disagreement, expected_remaining
+from telemetry import BeliefTelemetry
+from belief_map import BeliefMap
+from belief_store import save_snapshot, load_snapshot, decode_states
+from engine_eval import multipv_candidates, aggregate_candidates, expected_scores, best_voted_move, root_move_row, aggregate_matrix
+from engines import open_engine
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -19,9 +34,47 @@ class ImprovedAgent(Player):
         self.my_piece_captured_square = None
         self.count = None
         self.possible_states = set()
+        self.max_states = 10000
+        # keep the opponent move unexpanded until the sense result says which children survive
+        self.lazy_expansion = False
+        self.pending_parents = None
+        self.pending_capture_square = None
+        # parsed boards for this turn's states, so each FEN goes through chess.Board() once per turn
+        self.boards = BoardPool()
         self.lock = Lock()
+        # number of principal variations collected per state; 0 keeps the single engine.play move per state
+        self.multipv = 0
+        # score only our own move_actions via root_moves and aggregate the states x moves matrix
+        self.root_move_scoring = False
+        self.max_king_risk = 0.5
+        self.min_move_coverage = 0.5
+        self.decisive_threshold = 0.5
+        # representatives per cluster of look-alike states in evaluate_moves; 0 evaluates every state. States are
+        # told apart around our king and along our cluster_moves best-looking moves on the likely board
+        self.cluster_representatives = 0
+        self.cluster_moves = 4
+        # engine moves by FEN for the current turn, filled by evaluate_state and by pondering
+        self.eval_cache = {}
+        # use the opponent's thinking time to pre-expand, score sense squares and warm eval_cache
+        self.pondering = False
+        self.ponder_time = 0.05
+        # sense where the states' cached best moves disagree, rather than where the most states are told apart
+        self.decision_sensing = False
+        # belief sizes and memory per turn and stage, written to telemetry_dir at game end when it is set
+        self.telemetry = BeliefTelemetry()
+        self.telemetry_dir = None
+        # per-square piece probabilities over the belief set, refreshed after every belief update
+        self.belief_map = None
+        # learned_eval.py model file; when set, moves are scored by it over the whole belief set instead of the engine
+        self.evaluator_path = None
+        self.evaluator = None
+        self.ponderer = Ponderer(lambda fen: self.expansion(None)(fen), self.warm_eval_cache)
+        # replays saved by rc_bot_match; opponent moves below move_threshold are not expanded
+        self.history_dir = '.'
+        self.move_threshold = 0.01
+        self.opponent_model = None
         try:
-            self.engine = chess.engine.SimpleEngine.popen_uci('./opt/stockfish/stockfish', setpgrp=True)
+            self.engine = open_engine()
         except Exception as e:
             logging.error(f'Failed to start Stockfish engine: {e}')
             raise
@@ -33,16 +86,47 @@ class ImprovedAgent(Player):
         self.color = color
         self.opponent = opponent_name
         self.possible_states = {board.fen()}
+        self.belief_map = None
+        self.opponent_moved = color == chess.BLACK
+        self.opponent_model = OpponentModel.from_directory(self.history_dir, opponent_name)
+        logging.info(f'Opponent model for {opponent_name} learned from {self.opponent_model.games} games')
+        if self.evaluator_path is not None and self.evaluator is None:
+            self.evaluator = Evaluator.load(self.evaluator_path)
+        self.telemetry.start_game(color=chess.COLOR_NAMES[color], opponent=opponent_name)
+        self.telemetry.record('start', self.possible_states)
 
     def handle_opponent_move_result(self, captured_my_piece, capture_square):
         logging.info(f'Opponent move result. Captured my piece: {captured_my_piece}, Capture square: {capture_square}')
         self.my_piece_captured_square = capture_square
         if captured_my_piece:
             self.board.remove_piece_at(capture_square)
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
+        self.ponderer.stop()
+        self.telemetry.start_turn()
+
+        logging.debug(f'Boards parsed last turn: {self.boards.parses}, reused: {self.boards.hits}')
+        self.boards.clear()
+        if not self.opponent_moved:
+            self.opponent_moved = True
+            return
+        valid_states = [state for state in self.possible_states if self.is_valid_fen(state)]
+        if self.lazy_expansion:
+            self.pending_parents = valid_states
+            self.pending_capture_square = capture_square
         else:
-            self.possible_states = {next_state for state in self.possible_states for next_state in nextStatePrediction(state)}
+            if capture_square is None and self.ponderer.belief is not None:
+                # the pondered no-capture expansion is exactly what this would compute
+                self.possible_states = self.ponderer.belief
+            else:
+                self.possible_states = update_belief(valid_states, self.expansion(capture_square),
+                                                     cap=self.max_states)
+            self.telemetry.record('expansion', self.possible_states)
+            self.belief_map = BeliefMap.from_states(self.possible_states)
+
+    def expansion(self, capture_square):
+        if self.opponent_model is not None and self.opponent_model.games:
+            return partial(self.opponent_model.successors, capture_square=capture_square, boards=self.boards,
+                           threshold=self.move_threshold)
+        return partial(opponent_move_successors, capture_square=capture_square, boards=self.boards)
 
     def choose_sense(self, sense_actions, move_actions, seconds_left):
         logging.debug(f'Choosing sense. Sense actions: {sense_actions}, Move actions: {move_actions}, Seconds left: {seconds_left}')
@@ -53,36 +137,79 @@ class ImprovedAgent(Player):
             logging.info(f'Choosing captured square for sense: {self.my_piece_captured_square}')
             return self.my_piece_captured_square
 
-        future_move = self.future_move(move_actions, seconds_left)
-        if future_move is not None and self.board.piece_at(future_move.to_square) is not None:
-            logging.info(f'Choosing future move square for sense: {future_move.to_square}')
-            return future_move.to_square
-
+        # decision sensing needs our own squares filtered out first, and replaces the one-board future-move guess
         for square, piece in self.board.piece_map().items():
             if piece.color == self.color and square in valid_sense_actions:
                 valid_sense_actions.remove(square)
+        decision_sense = self.decision_sense(valid_sense_actions) if self.decision_sensing else None
+        if decision_sense is not None:
+            logging.info(f'Chosen sense square: {decision_sense}')
+            return decision_sense
 
-        chosen_sense = random.choice(valid_sense_actions)
+        future_move = self.future_move(move_actions, seconds_left)
+        if future_move is not None and self.likely_board().piece_at(future_move.to_square) is not None:
+            logging.info(f'Choosing future move square for sense: {future_move.to_square}')
+            return future_move.to_square
+
+        pondered = {square: score for square, score in self.ponderer.sense_scores.items()
+                    if square in valid_sense_actions}
+        if pondered:
+            chosen_sense = min(pondered, key=pondered.get)
+        else:
+            chosen_sense = random.choice(valid_sense_actions)
         logging.info(f'Chosen sense square: {chosen_sense}')
         return chosen_sense
 
+    def decision_sense(self, sense_actions):
+        # only states whose best move is already in eval_cache (warmed while pondering) take part; no engine calls
+        known = [(fen, self.eval_cache.get(fen)) for fen in self.possible_states]
+        known = [(fen, move.uci()) for fen, move in known if move is not None]
+        if not sense_actions or len({move for _, move in known}) < 2:
+            return None
+        codes = state_codes([fen for fen, _ in known])
+        disagreement = expected_disagreement(codes, [move for _, move in known], sense_actions)
+        remaining = expected_remaining(codes, sense_actions)
+        square = min(sense_actions, key=lambda square: (disagreement[square], remaining[square], square))
+        logging.info(f'Decision sense over {len(known)} evaluated states: {square}, '
+                     f'disagreement left {disagreement[square]:.2f}')
+        return square
+
     def handle_sense_result(self, sense_result):
         logging.info(f'Handling sense result: {sense_result}')
         for square, piece in sense_result:
             self.board.set_piece_at(square, piece)
 
-        window = ";".join(
-            [f"{chess.SQUARE_NAMES[square]}:{piece.symbol() if piece else '?'}" for square, piece in sense_result])
-        self.possible_states = {state for fen in self.possible_states for state in nextStateWithSense(fen, window)}
+        observation = SenseObservation(sense_result)
+        if self.pending_parents is not None:
+            parents, self.pending_parents = self.pending_parents, None
+            if observation:
+                successors = partial(sense_consistent_successors, observation=observation,
+                                     capture_square=self.pending_capture_square, boards=self.boards)
+            else:
+                successors = self.expansion(self.pending_capture_square)
+            self.possible_states = update_belief(parents, successors, cap=self.max_states)
+        else:
+            self.possible_states = [fen for fen in filter_sense(self.possible_states, observation)
+                                    if self.is_valid_fen(fen)]
+        self.telemetry.record('sense', self.possible_states)
+        self.belief_map = BeliefMap.from_states(self.possible_states)
 
     def select_common_move(self, move_actions):
         logging.debug(f'Selecting common move from actions: {move_actions}')
+        if self.multipv:
+            return self.select_common_move_multipv(move_actions)
+        if self.evaluator is not None:
+            move_scores = self.evaluate_learned_moves(move_actions)
+            best = max(sorted(move_scores), key=move_scores.get)
+            logging.info(f'Best learned move selected: {best}')
+            return chess.Move.from_uci(best)
+
         move_counter = Counter()
         with concurrent.futures.ThreadPoolExecutor() as executor:
             futures = {executor.submit(self.evaluate_state, fen, move_actions): fen for fen in self.possible_states}
             for future in concurrent.futures.as_completed(futures):
                 try:
-                    move = future.result()
+                    move, _ = future.result()
                     if move:
                         move_counter[move.uci()] += 1
                 except Exception as exc:
@@ -97,46 +224,81 @@ class ImprovedAgent(Player):
         logging.info(f'Most common move selected: {most_common_move}')
         return chess.Move.from_uci(most_common_move)
 
+    def select_common_move_multipv(self, move_actions):
+        candidate_lists = self.collect_candidates(move_actions)
+        votes, _, _ = aggregate_candidates(candidate_lists)
+        move = best_voted_move(votes, expected_scores(candidate_lists))
+        if move is None:
+            move = random.choice(list(move_actions))
+            logging.info(f'No candidate moves found. Choosing random move: {move}')
+            return move
+        logging.info(f'Most voted multipv move selected: {move}')
+        return move
+
+    def collect_candidates(self, move_actions, states=None):
+        # one candidate list per state, in the order of `states`
+        states = list(self.possible_states if states is None else states)
+        candidate_lists = [[] for _ in states]
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {executor.submit(self.evaluate_state_candidates, fen, move_actions): i
+                       for i, fen in enumerate(states)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    candidate_lists[futures[future]] = future.result()
+                except Exception as exc:
+                    logging.error(f'Error evaluating state: {exc}')
+        return candidate_lists
+
     def future_move(self, move_actions, seconds_left):
         logging.debug(f'Predicting future move. Move actions: {move_actions}, Seconds left: {seconds_left}')
-        enemy_king_square = self.board.king(not self.color)
+        board = self.likely_board()
+        enemy_king_square = board.king(not self.color)
         if enemy_king_square:
-            enemy_king_attackers = self.board.attackers(self.color, enemy_king_square)
+            enemy_king_attackers = board.attackers(self.color, enemy_king_square)
             if enemy_king_attackers:
                 attacker_square = enemy_king_attackers.pop()
                 future_move = chess.Move(attacker_square, enemy_king_square)
                 logging.info(f'Future move attacking enemy king: {future_move}')
                 return future_move
 
+        if not board.is_valid():
+            # the engine must never see a position it can crash on; a crash costs restarts for the whole game
+            logging.info(f'Likely board is not a legal chess position, no future move: {board.fen()}')
+            return None
+
         try:
-            self.board.turn = self.color
-            self.board.clear_stack()
-            result = self.engine.play(self.board, chess.engine.Limit(time=0.1))
+            result = self.engine.play(board, chess.engine.Limit(time=0.1))
             logging.info(f'Stockfish suggested move: {result.move}')
             return result.move
         except chess.engine.EngineTerminatedError:
             logging.error('Stockfish Engine died')
         except chess.engine.EngineError:
-            logging.error(f'Stockfish Engine bad state at "{self.board.fen()}"')
+            logging.error(f'Stockfish Engine bad state at "{board.fen()}"')
 
         logging.info('No future move found, returning None')
         return None
 
+    def likely_board(self):
+        # the most likely board under the belief set, the guessed self.board only when there is no belief
+        if self.belief_map is None:
+            board = self.board.copy(stack=False)
+            board.turn = self.color
+            return board
+        return self.belief_map.board(self.color)
+
     def choose_move(self, move_actions, seconds_left):
         logging.debug(f'Choosing move. Move actions: {move_actions}, Seconds left: {seconds_left}')
-        enemy_king_square = self.board.king(not self.color)
-        if enemy_king_square:
-            enemy_king_attackers = self.board.attackers(self.color, enemy_king_square)
-            if enemy_king_attackers:
-                attacker_square = enemy_king_attackers.pop()
-                move = chess.Move(attacker_square, enemy_king_square)
-                if self.board.is_legal(move):
-                    logging.info(f'Choosing move to capture enemy king: {move}')
-                    return move
-
-        max_states = 10000
-        if len(self.possible_states) > max_states:
-            self.possible_states = random.sample(self.possible_states, max_states)
+        # our own legality checks below run on the guessed board with us to move
+        self.board.turn = self.color
+        self.board.clear_stack()
+        move, reason = decisive_move(self.possible_states or [self.board.fen()], self.color, move_actions,
+                                     self.decisive_threshold)
+        if move is not None:
+            logging.info(f'Decisive move ({reason}): {move}')
+            return move
+
+        if len(self.possible_states) > self.max_states:
+            self.possible_states = random.sample(list(self.possible_states), self.max_states)
 
         move_scores = self.evaluate_moves(move_actions, seconds_left)
 
@@ -157,16 +319,28 @@ class ImprovedAgent(Player):
         if taken_move is not None and self.board.is_legal(taken_move):
             self.board.push(taken_move)
         if captured_opponent_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
+            self.possible_states = apply_own_capture(self.possible_states, taken_move, capture_square, self.boards)
         else:
-            if taken_move:
-                self.possible_states = [execute_move(state, taken_move.uci()) for state in self.possible_states if self.is_valid_fen(state)]
-            else:
-                self.possible_states = [state for state in self.possible_states if state == self.board.fen()]
+            valid_states = (state for state in self.possible_states if self.is_valid_fen(state))
+            self.possible_states = apply_move_feedback(valid_states, requested_move, taken_move, capture_square,
+                                                       self.boards)
+        self.telemetry.record('move', self.possible_states)
+        self.belief_map = BeliefMap.from_states(self.possible_states)
+        self.eval_cache.clear()
+        if self.pondering:
+            valid_states = [state for state in self.possible_states if self.is_valid_fen(state)]
+            self.ponderer.start(valid_states, chess.SquareSet(chess.BB_ALL & ~(
+                chess.BB_RANK_1 | chess.BB_RANK_8 | chess.BB_FILE_A | chess.BB_FILE_H)), self.max_states)
 
     def handle_game_end(self, winner_color, win_reason, game_history):
         logging.info(f'Game ended. Winner color: {winner_color}, Win reason: {win_reason}')
+        self.ponderer.stop()
+        if self.opponent_model is not None:
+            self.opponent_model.learn(game_history, self.opponent)
+        if self.telemetry_dir is not None:
+            path = os.path.join(self.telemetry_dir, f'telemetry-{self.opponent}-{time.strftime("%Y_%m_%d-%H_%M_%S")}.json')
+            self.telemetry.export(path)
+            logging.info(f'Belief telemetry saved to {path}')
         self.engine.quit()
         if winner_color == self.color:
             logging.info("Game Over. Improved won!")
@@ -175,131 +349,143 @@ class ImprovedAgent(Player):
         else:
             logging.info("Game Over. Improved lost.")
 
+    def save_belief(self, path):
+        # checkpoint the current belief set as a binary snapshot (see belief_store)
+        save_snapshot(path, self.possible_states)
+
+    def load_belief(self, path):
+        self.possible_states = decode_states(load_snapshot(path))
+
     def is_valid_fen(self, fen):
-        try:
-            board = chess.Board(fen)
-            return board.is_valid()
-        except ValueError:
-            return False
+        return self.boards.is_valid(fen)
+
+    def evaluation_states(self, move_actions):
+        # (states, weights) to send to the engine; weights None means every state counts once
+        if not self.cluster_representatives:
+            return list(self.possible_states), None
+        moves = candidate_moves(self.likely_board(), move_actions, self.cluster_moves)
+        squares = relevant_squares(self.color, self.board.king(self.color), moves)
+        states, weights = cluster_states(self.possible_states, squares, self.cluster_representatives)
+        logging.debug(f'Evaluating {len(states)} representatives of {len(self.possible_states)} states')
+        return states, weights
 
     def evaluate_moves(self, move_actions, seconds_left):
+        states, weights = self.evaluation_states(move_actions)
+        if self.evaluator is not None:
+            return self.evaluate_learned_moves(move_actions, states, weights)
+        if self.root_move_scoring:
+            return self.evaluate_root_moves(move_actions, states, weights)
+        if self.multipv:
+            return expected_scores(self.collect_candidates(move_actions, states), weights)
+
         move_scores = {}
         with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = {executor.submit(self.evaluate_state, fen, move_actions): fen for fen in self.possible_states}
+            futures = {executor.submit(self.evaluate_state, fen, move_actions): i for i, fen in enumerate(states)}
             for future in concurrent.futures.as_completed(futures):
                 try:
                     move, score = future.result()
                     if move is not None:
-                        if move.uci() in move_scores:
-                            move_scores[move.uci()] += score
-                        else:
-                            move_scores[move.uci()] = score
+                        weight = 1 if weights is None else weights[futures[future]]
+                        move_scores[move.uci()] = move_scores.get(move.uci(), 0) + score * weight
                 except Exception as exc:
                     logging.error(f'Error evaluating state: {exc}')
         return move_scores
 
+    def evaluate_learned_moves(self, move_actions, states=None, weights=None):
+        moves = [move for move in move_actions if self.board.is_legal(move)] or list(move_actions)
+        states = list(self.possible_states if states is None else states) or [self.board.fen()]
+        scores = score_moves(self.evaluator, state_codes(states), moves, self.color, weights)
+        return {move.uci(): score for move, score in scores.items()}
+
+    def evaluate_root_moves(self, move_actions, states=None, weights=None):
+        moves = [move for move in move_actions if self.board.is_legal(move)] or list(move_actions)
+        states = list(self.possible_states if states is None else states)
+        scores = np.full((len(states), len(moves)), np.nan)
+        king_risk = np.zeros((len(states), len(moves)), dtype=bool)
+        time_limit = chess.engine.Limit(time=min(1, 10 / max(len(states), 1)))
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            futures = {executor.submit(root_move_row, self.engine, self.boards.get(fen), moves, time_limit, self.color): i
+                       for i, fen in enumerate(states)}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    scores[futures[future]], king_risk[futures[future]] = future.result()
+                except Exception as exc:
+                    logging.error(f'Error evaluating state: {exc}')
+
+        expected, worst, risk = aggregate_matrix(scores, king_risk, weights, self.min_move_coverage)
+        move_scores = {}
+        for j, move in enumerate(moves):
+            if np.isnan(expected[j]) or risk[j] > self.max_king_risk:
+                continue
+            move_scores[move.uci()] = float(expected[j])
+            logging.debug(f'{move}: expected {expected[j]:.0f}, worst {worst[j]:.0f}, king risk {risk[j]:.2f}')
+        return move_scores
+
     def evaluate_state(self, fen, move_actions):
         try:
-            board = chess.Board(fen)
-            if not board.is_valid():
+            if not self.is_valid_fen(fen):
                 return None, 0
+            board = self.boards.copy(fen)
             self.board.turn = self.color
             self.board.clear_stack()
-            time_limit = min(1, 10 / len(self.possible_states))
-            result = self.engine.play(board, chess.engine.Limit(time=time_limit), info=chess.engine.INFO_SCORE)
-            move = result.move
+            move = self.eval_cache.get(fen)
+            if move is None:
+                time_limit = min(1, 10 / len(self.possible_states))
+                result = self.engine.play(board, chess.engine.Limit(time=time_limit), info=chess.engine.INFO_SCORE)
+                move = self.eval_cache[fen] = result.move
 
             if move is None or not self.board.is_legal(move):
                 return None, 0
 
-            score = 0
-            board.push(move)
-            enemy_king_square = board.king(not self.color)
-            if enemy_king_square:
-                enemy_king_attackers = board.attackers(self.color, enemy_king_square)
-                if enemy_king_attackers:
-                    score += 2000
-
-            my_king_square = board.king(self.color)
-            if my_king_square:
-                my_king_attackers = board.attackers(not self.color, my_king_square)
-                if my_king_attackers:
-                    score -= 2000
-
-            board.pop()
-
-            if board.is_capture(move):
-                captured_piece = board.piece_at(move.to_square)
-                if captured_piece:
-                    if captured_piece.piece_type == chess.KING:
-                        score += 900
-                    elif captured_piece.piece_type != chess.PAWN:
-                        score += 500
-                    else:
-                        score += 100
-
-            return move, score
+            return move, self.move_bonus(board, move)
         except Exception as e:
             logging.error(f'Error evaluating state {fen}: {e}')
             return None, 0
 
+    def warm_eval_cache(self, fen):
+        if fen not in self.eval_cache and self.is_valid_fen(fen):
+            self.eval_cache[fen] = self.engine.play(self.boards.copy(fen), chess.engine.Limit(time=self.ponder_time)).move
 
-def nextStatePrediction(fen):
-    board = chess.Board(fen)
-    if not board.is_valid():
-        return []
-    next_positions = []
-
-    for move in board.legal_moves:
-        temp_board = board.copy()
-        temp_board.push(move)
-        next_positions.append(temp_board.fen())
-
-    next_positions.sort()
-    return next_positions
-
-def nextStateWithSense(fen, window):
-    board = chess.Board(fen)
-    if not board.is_valid():
-        return []
-    for square_name, piece_symbol in (item.split(':') for item in window.split(';')):
-        square = chess.parse_square(square_name)
-        if piece_symbol == '?':
-            if board.piece_at(square) is not None:
-                return {fen}
-        else:
-            piece = chess.Piece.from_symbol(piece_symbol)
-            if board.piece_at(square) != piece:
-                return {}
-    return {fen}
-
-def predict_next_states_with_captures(fen_list, capture_square):
-    capture_moves = set()
-    for fen in fen_list:
-        board = chess.Board(fen)
-        if not board.is_valid():
-            continue
+    def evaluate_state_candidates(self, fen, move_actions):
         try:
-            capture_square_index = chess.parse_square(capture_square)
-            for move in board.generate_legal_captures():
-                if move.to_square == capture_square_index and board.is_capture(move):
-                    board.push(move)
-                    capture_moves.add(board.fen())
-                    board.pop()
-        except ValueError:
-            pass
-
-    return capture_moves
-
-def execute_move(fen, move):
-    try:
-        board = chess.Board(fen)
-        chess_move = chess.Move.from_uci(move)
-        if chess_move in board.legal_moves:
-            board.push(chess_move)
-            return board.fen()
-        else:
-            return fen
-    except ValueError:
-        return fen
+            if not self.is_valid_fen(fen):
+                return []
+            board = self.boards.copy(fen)
+            time_limit = min(1, 10 / len(self.possible_states))
+            candidates = multipv_candidates(self.engine, board, chess.engine.Limit(time=time_limit),
+                                            self.multipv, self.color)
+            return [(move, score + self.move_bonus(board, move)) for move, score in candidates
+                    if move in move_actions and self.board.is_legal(move)]
+        except Exception as e:
+            logging.error(f'Error evaluating state {fen}: {e}')
+            return []
 
+    def move_bonus(self, board, move):
+        score = 0
+        board.push(move)
+        enemy_king_square = board.king(not self.color)
+        if enemy_king_square:
+            enemy_king_attackers = board.attackers(self.color, enemy_king_square)
+            if enemy_king_attackers:
+                score += 2000
+
+        my_king_square = board.king(self.color)
+        if my_king_square:
+            my_king_attackers = board.attackers(not self.color, my_king_square)
+            if my_king_attackers:
+                score -= 2000
+
+        board.pop()
+
+        if board.is_capture(move):
+            captured_piece = board.piece_at(move.to_square)
+            if captured_piece:
+                if captured_piece.piece_type == chess.KING:
+                    score += 900
+                elif captured_piece.piece_type != chess.PAWN:
+                    score += 500
+                else:
+                    score += 100
+
+        return score
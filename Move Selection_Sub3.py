@@ -2,32 +2,107 @@ import chess
 import chess.engine
 from collections import Counter
 import os
+import sys
+import json
+import queue
+import itertools
+import argparse
+import concurrent.futures
+import engines
+
+ENGINE_PATH = '/opt/stockfish/stockfish'  # Adjust this path as necessary
 
-def select_common_move(fen_list):
-    engine_path = '/opt/stockfish/stockfish'  # Adjust this path as necessary
 
-    # Check if Stockfish executable exists at the specified path
-    if not os.path.exists(engine_path):
+def open_engine(engine_path=ENGINE_PATH):
+    # Check if Stockfish executable exists at the specified path, unless engines.py is told to run something else
+    substituted = os.environ.get('RBC_ENGINE') or os.environ.get('RBC_ENGINE_MODE') == 'replay'
+    if not substituted and not os.path.exists(engine_path):
         raise FileNotFoundError(f"Stockfish engine not found at {engine_path}")
+    return engines.open_engine(engine_path)
+
+
+def common_move(fen_list, engine, limit):
+    move_counter = Counter()
+    for fen in fen_list:
+        board = chess.Board(fen)
+        if board.is_checkmate():
+            move = list(board.legal_moves)[0]
+        else:
+            result = engine.play(board, limit)
+            move = result.move
+        move_counter[move.uci()] += 1
 
-    with chess.engine.SimpleEngine.popen_uci(engine_path) as engine:
-        move_counter = Counter()
-        for fen in fen_list:
-            board = chess.Board(fen)
-            if board.is_checkmate():
-                move = list(board.legal_moves)[0]
-            else:
-                result = engine.play(board, chess.engine.Limit(time=0.5))
-                move = result.move
-            move_counter[move.uci()] += 1
-
-    
     most_common_move = sorted(move_counter.items(), key=lambda x: (-x[1], x[0]))[0][0]
     return most_common_move
 
 
-n_boards = int(input())
-fen_strings = [input() for i in range(n_boards)]
+def select_common_move(fen_list):
+    with open_engine() as engine:
+        return common_move(fen_list, engine, chess.engine.Limit(time=0.5))
+
+
+def run_batch(jobs, out, pool_size=1, limit=None, engine_path=ENGINE_PATH):
+    # spreads FEN-set jobs over a pool of warm engines and writes each result as soon as it is ready
+    limit = limit or chess.engine.Limit(time=0.5)
+    pool = queue.Queue()
+    for _ in range(pool_size):
+        pool.put(open_engine(engine_path))
+
+    def solve(job):
+        engine = pool.get()
+        try:
+            return {'id': job.get('id'), 'move': common_move(job['fens'], engine, limit)}
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, ValueError, IndexError) as e:
+            return {'id': job.get('id'), 'error': str(e)}
+        finally:
+            pool.put(engine)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+            # only a few jobs are read ahead, so results stream out while stdin is still being written
+            jobs = iter(jobs)
+            pending = {executor.submit(solve, job) for job in itertools.islice(jobs, pool_size * 2)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    out.write(json.dumps(future.result()) + '\n')
+                    out.flush()
+                pending.update(executor.submit(solve, job) for job in itertools.islice(jobs, len(done)))
+    finally:
+        while not pool.empty():
+            pool.get().quit()
+
+
+def read_jobs(lines):
+    for number, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        if isinstance(job, list):
+            job = {'fens': job}
+        job.setdefault('id', number)
+        yield job
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pick the most common engine move over a set of boards.')
+    parser.add_argument('--batch', action='store_true',
+                        help='read JSONL jobs ({"id": ..., "fens": [...]}) and write JSONL results as they finish')
+    parser.add_argument('--input', help='job file for --batch, defaults to stdin')
+    parser.add_argument('--engines', type=int, default=os.cpu_count() or 1, help='number of warm engines')
+    parser.add_argument('--time', type=float, help='seconds per board')
+    parser.add_argument('--nodes', type=int, help='nodes per board')
+    parser.add_argument('--engine-path', default=ENGINE_PATH)
+    args = parser.parse_args()
 
+    if args.batch:
+        time_limit = args.time if args.time is not None else (None if args.nodes else 0.5)
+        limit = chess.engine.Limit(time=time_limit, nodes=args.nodes)
+        with (open(args.input) if args.input else sys.stdin) as lines:
+            run_batch(read_jobs(lines), sys.stdout, args.engines, limit, args.engine_path)
+    else:
+        n_boards = int(input())
+        fen_strings = [input() for i in range(n_boards)]
 
-print(select_common_move(fen_strings))
\ No newline at end of file
+        print(select_common_move(fen_strings))
@@ -4,6 +4,9 @@ import chess.engine
 from collections import Counter
 import os
 import random
+from functools import partial
+from belief import update_belief, opponent_move_successors, apply_move_feedback, apply_own_capture, SenseObservation, filter_sense
+from engines import open_engine
 
 
 class MyAgent(Player):
@@ -12,21 +15,23 @@ class MyAgent(Player):
         self.color = None
         self.opponent = None
         self.possible_states = []
-        self.engine = chess.engine.SimpleEngine.popen_uci('stockfish-windows-x86-64-avx2.exe', setpgrp=True)
+        self.max_states = 1000  # Limit the number of states to consider
+        self.engine = open_engine('stockfish-windows-x86-64-avx2.exe')
 
     def handle_game_start(self, color, board, opponent_name):
         self.board = board
         self.color = color
         self.opponent = opponent_name
         self.possible_states = [board.fen()]
+        self.opponent_moved = color == chess.BLACK
 
     def handle_opponent_move_result(self, captured_my_piece, capture_square):
-        if captured_my_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
-        else:
-            self.possible_states = [next_state for state in self.possible_states for next_state in
-                                    nextStatePrediction(state)]
+        if not self.opponent_moved:
+            self.opponent_moved = True
+            return
+        self.possible_states = update_belief(self.possible_states,
+                                             partial(opponent_move_successors, capture_square=capture_square),
+                                             cap=self.max_states)
 
     def choose_sense(self, sense_actions, move_actions, seconds_left):
         valid_sense_actions = [square for square in sense_actions if square not in [
@@ -42,15 +47,11 @@ class MyAgent(Player):
         return random.choice(valid_sense_actions)
 
     def handle_sense_result(self, sense_result):
-        window = ";".join(
-            [f"{chess.SQUARE_NAMES[square]}:{piece.symbol() if piece else '?'}" for square, piece in sense_result])
-        self.possible_states = [state for fen in self.possible_states for state in
-                                nextStateWithSense(fen, window)]
+        self.possible_states = filter_sense(self.possible_states, SenseObservation(sense_result))
 
     def choose_move(self, move_actions, seconds_left):
-        max_states = 1000  # Limit the number of states to consider
-        if len(self.possible_states) > max_states:
-            self.possible_states = random.sample(self.possible_states, max_states)
+        if len(self.possible_states) > self.max_states:
+            self.possible_states = random.sample(self.possible_states, self.max_states)
 
         move_counter = Counter()
         for fen in self.possible_states:
@@ -81,13 +82,9 @@ class MyAgent(Player):
             return random.choice(move_actions)
     def handle_move_result(self, requested_move, taken_move, captured_opponent_piece, capture_square):
         if captured_opponent_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
+            self.possible_states = apply_own_capture(self.possible_states, taken_move, capture_square)
         else:
-            if taken_move:
-                self.possible_states = [execute_move(state, taken_move.uci()) for state in self.possible_states]
-            else:
-                self.possible_states = [state for state in self.possible_states if state == self.board.fen()]
+            self.possible_states = apply_move_feedback(self.possible_states, requested_move, taken_move, capture_square)
 
     def handle_game_end(self, winner_color, win_reason, game_history):
         self.engine.quit()
@@ -99,76 +96,5 @@ class MyAgent(Player):
         #     print("Game Over. I lost.")
 
 
-def nextStatePrediction(fen):
-    board = chess.Board(fen)
-    next_positions = []
-
-    for move in board.legal_moves:
-        temp_board = board.copy()
-        temp_board.push(move)
-        next_positions.append(temp_board.fen())
-
-    next_positions.sort()
-    return next_positions
-
-
-def nextStateWithSense(fen, window):
-    board = chess.Board(fen)
-    rows = fen.split('/')
-    rows[-1] = rows[-1].split()[0]
-
-    expanded_rows = []
-    for row in rows:
-        expanded_row = ''
-        for char in row:
-            if char.isdigit():
-                expanded_row += '?' * int(char)
-            else:
-                expanded_row += char
-        expanded_rows.append(expanded_row)
-
-    view = window.split(';')
-    pairs = [square.split(':') for square in view]
-
-    for pair in pairs:
-        location = pair[0]
-        piece = pair[1]
-        letter = location[0]
-        number = location[1]
-        row = expanded_rows[abs(int(number) - 8)]
-        if row[ord(letter) - ord('a')] != piece:
-            return []
-
-    return [fen]
-
-
-def predict_next_states_with_captures(fen_list, capture_square):
-    capture_moves = []
-    for fen in fen_list:
-        board = chess.Board(fen)
-        try:
-            capture_square_index = chess.parse_square(capture_square)
-            for move in board.legal_moves:
-                if move.to_square == capture_square_index and board.is_capture(move):
-                    board.push(move)
-                    capture_moves.append(board.fen())
-                    board.pop()
-        except ValueError:
-            # Handle invalid capture_square gracefully
-            pass
-    capture_moves.sort()
-    return capture_moves
-
-
-def execute_move(fen, move):
-    board = chess.Board(fen)
-    chess_move = chess.Move.from_uci(move)
-    if chess_move in board.legal_moves:
-        board.push(chess_move)
-        return board.fen()
-    else:
-        return fen
-    
-
 #  & "C:\Users\thori\AppData\Roaming\Python\Python311\Scripts\rc-bot-match.exe" reconchess.bots.random_bot MyAgent.py
 #  & "C:\Users\thori\AppData\Roaming\Python\Python311\Scripts\rc-replay.exe" RandomBot-MyAgent-ERROR-2024_05_15-22_18_54.json    
\ No newline at end of file
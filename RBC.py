@@ -4,6 +4,10 @@ import chess.engine
 from collections import Counter
 import os
 import random
+from search import score_root_moves
+from pruning import prune
+from belief import SenseObservation, apply_move_feedback, apply_own_capture, filter_sense, opponent_moves
+from engines import open_engine
 
 
 class MyAgent(Player):
@@ -12,24 +16,28 @@ class MyAgent(Player):
         self.color = None
         self.opponent = None
         self.possible_states = set()
-        self.engine = chess.engine.SimpleEngine.popen_uci('./opt/stockfish/stockfish', setpgrp=True)
+        self.pruning_policy = 'top_k'
+        self.discarded_mass = 0.0
+        self.engine = open_engine()
 
     def handle_game_start(self, color, board, opponent_name):
         self.board = board
         self.color = color
         self.opponent = opponent_name
         self.possible_states = {board.fen()}
+        self.opponent_moved = color == chess.BLACK
 
     def handle_opponent_move_result(self, captured_my_piece, capture_square):
-        if captured_my_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
-        else:
-            self.possible_states = [next_state for state in self.possible_states for next_state, _ in
-                                    nextStatePrediction(state, self.engine, depth=3)]
+        if not self.opponent_moved:
+            self.opponent_moved = True
+            return
+
+        scored_states = [scored for state in self.possible_states
+                         for scored in nextStatePrediction(state, capture_square, self.engine, depth=3)]
 
         # Select a subset of promising states
-        self.possible_states = select_promising_states(self.possible_states, max_states=1000)
+        self.possible_states, self.discarded_mass = select_promising_states(scored_states, max_states=1000,
+                                                                            policy=self.pruning_policy)
 
     def choose_sense(self, sense_actions, move_actions, seconds_left):
         valid_sense_actions = [square for square in sense_actions if square not in chess.SquareSet(
@@ -37,11 +45,9 @@ class MyAgent(Player):
         return random.choice(valid_sense_actions)
 
     def handle_sense_result(self, sense_result):
-        window = ";".join(
-            [f"{chess.SQUARE_NAMES[square]}:{piece.symbol() if piece else '?'}" for square, piece in sense_result])
-
         # Filter the possible states based on the current sensing result
-        self.possible_states = [state for state, _ in self.possible_states if nextStateWithSense(state, window)]
+        observation = SenseObservation(sense_result)
+        self.possible_states = filter_sense(self.possible_states, observation)
 
     def choose_move(self, move_actions, seconds_left):
         max_states = 1000  # Limit the number of states to consider
@@ -75,13 +81,9 @@ class MyAgent(Player):
 
     def handle_move_result(self, requested_move, taken_move, captured_opponent_piece, capture_square):
         if captured_opponent_piece:
-            capture_square_name = chess.SQUARE_NAMES[capture_square]
-            self.possible_states = predict_next_states_with_captures(self.possible_states, capture_square_name)
+            self.possible_states = apply_own_capture(self.possible_states, taken_move, capture_square)
         else:
-            if taken_move:
-                self.possible_states = [execute_move(state, taken_move.uci()) for state in self.possible_states]
-            else:
-                self.possible_states = [state for state in self.possible_states if state == self.board.fen()]
+            self.possible_states = apply_move_feedback(self.possible_states, requested_move, taken_move, capture_square)
 
     def handle_game_end(self, winner_color, win_reason, game_history):
         self.engine.quit()
@@ -93,97 +95,27 @@ class MyAgent(Player):
             print("Game Over. Shakeel lost.")
 
 
-def nextStatePrediction(fen, engine, depth, alpha=-float('inf'), beta=float('inf'), time_limit=0.1):
+def nextStatePrediction(fen, capture_square=None, engine=None, depth=3, time_limit=0.1, node_limit=2000):
+    # children scored by an in-process alpha-beta search; the engine only sees the root position
     board = chess.Board(fen)
-
-    if depth == 0:
-        info = engine.analyse(board, chess.engine.Limit(time=time_limit))
-        score = info["score"].white().score()
-        if score is None:
-            score = 0
-        return [(board.fen(), score)]
+    scores = score_root_moves(board, depth, node_limit=node_limit, time_limit=time_limit, engine=engine,
+                              engine_limit=chess.engine.Limit(time=time_limit),
+                              moves=opponent_moves(board, capture_square))
 
     next_positions = []
-
-    for move in board.legal_moves:
+    for move, score in scores.items():
         board.push(move)
-
-        # Recursively evaluate the next positions
-        next_pos = nextStatePrediction(board.fen(), engine, depth - 1, -beta, -alpha, time_limit)
-
-        # Negamax score for the current move
-        score = -next_pos[0][1]
-
         next_positions.append((board.fen(), score))
-
         board.pop()
 
-        # Update alpha value
-        alpha = max(alpha, score)
-
-        # Alpha-beta pruning
-        if alpha >= beta:
-            break
-
     # Sort the positions based on the evaluation score in descending order
     next_positions.sort(key=lambda x: x[1], reverse=True)
 
     return next_positions
 
 
-def nextStateWithSense(fen, window):
-    if not isinstance(fen, str):
-        raise TypeError("Expected 'fen' to be a string, got {}".format(type(fen)))
-
-    board = chess.Board(fen)
-    for square_name, piece_symbol in (item.split(':') for item in window.split(';')):
-        square = chess.parse_square(square_name)
-        if piece_symbol == '?':
-            if board.piece_at(square) is not None:
-                return False
-        else:
-            piece = chess.Piece.from_symbol(piece_symbol)
-            if board.piece_at(square) != piece:
-                return False
-    return True
-
-
-def predict_next_states_with_captures(fen_list, capture_square):
-    capture_moves = set()
-    for fen in fen_list:
-        board = chess.Board(fen)
-        try:
-            capture_square_index = chess.parse_square(capture_square)
-            for move in board.generate_legal_captures():
-                if move.to_square == capture_square_index and board.is_capture(move):
-                    board.push(move)
-                    capture_moves.add(board.fen())
-                    board.pop()
-        except ValueError:
-            # Handle invalid capture_square gracefully
-            pass
-
-    return capture_moves
-
-
-def select_promising_states(states, max_states):
-    if len(states) <= max_states:
-        return states
-
-    # Sort the states based on their evaluation scores
-    sorted_states = sorted(states, key=lambda x: x[1], reverse=True)
-
-    # Select the top max_states promising states
-    promising_states = sorted_states[:max_states]
-
-    return [state for state, _ in promising_states]
-
-
-def execute_move(fen, move):
-    board = chess.Board(fen)
-    chess_move = chess.Move.from_uci(move)
-    if chess_move in board.legal_moves:
-        board.push(chess_move)
-        return board.fen()
-    else:
-        return fen
+def select_promising_states(scored_states, max_states, policy='top_k'):
+    # takes (fen, score) pairs, returns the kept FENs and the share of states that were dropped
+    scored_states = dict(scored_states)
+    result = prune(list(scored_states), list(scored_states.values()), max_states, policy)
+    return result.states, result.discarded_mass
@@ -0,0 +1,88 @@
+import sys
+import argparse
+import itertools
+import multiprocessing
+import chess
+
+# Bulk version of State_Representation_3.py and "Next State Prediction_Sub4.py".
+# Input is one record per line, "<fen>\t<move>" for `move` or "<fen>\t<square>" for `capture`.
+# Output follows the single-record scripts, in input order: `move` prints the new FEN (or "Illegal move")
+# per record, `capture` prints the sorted resulting FENs of each record followed by a blank line.
+
+
+def execute_move(fen, move):
+    board = chess.Board(fen)
+    chess_move = chess.Move.from_uci(move)
+    if chess_move in board.legal_moves:
+        board.push(chess_move)
+        return board.fen()
+    else:
+        return "Illegal move"
+
+
+def predict_next_states_with_captures(fen, capture_square):
+    board = chess.Board(fen)
+    capture_square = chess.parse_square(capture_square)
+    capture_moves = []
+
+    for move in board.generate_legal_captures(to_mask=chess.BB_SQUARES[capture_square]):
+        board.push(move)
+        capture_moves.append(board.fen())
+        board.pop()
+
+    capture_moves.sort()
+    return capture_moves
+
+
+def process_move_batch(lines):
+    out = []
+    for line in lines:
+        fen, move = line.rstrip('\r\n').split('\t')
+        out.append(execute_move(fen, move) + '\n')
+    return ''.join(out)
+
+
+def process_capture_batch(lines):
+    out = []
+    for line in lines:
+        fen, capture_square = line.rstrip('\r\n').split('\t')
+        for state in predict_next_states_with_captures(fen, capture_square):
+            out.append(state + '\n')
+        out.append('\n')
+    return ''.join(out)
+
+
+PROCESSORS = {'move': process_move_batch, 'capture': process_capture_batch}
+
+
+def batches(lines, size):
+    lines = (line for line in lines if line.strip())
+    while True:
+        batch = list(itertools.islice(lines, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run(mode, lines, out, workers=None, batch_size=10000):
+    process = PROCESSORS[mode]
+    if workers == 1:
+        for batch in batches(lines, batch_size):
+            out.write(process(batch))
+        return
+    with multiprocessing.Pool(workers) as pool:
+        # imap keeps results in input order while batches run on every core
+        for result in pool.imap(process, batches(lines, batch_size)):
+            out.write(result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream state transitions or capture predictions in bulk.')
+    parser.add_argument('mode', choices=sorted(PROCESSORS))
+    parser.add_argument('input', nargs='?', help='record file, defaults to stdin')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to the number of cores')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    with (open(args.input) if args.input else sys.stdin) as lines:
+        run(args.mode, lines, sys.stdout, args.workers, args.batch_size)
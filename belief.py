@@ -0,0 +1,261 @@
+import chess
+import heapq
+import hashlib
+import numpy as np
+import random
+from threading import Lock
+from reconchess.utilities import add_pawn_queen_promotion, revise_move, capture_square_of_move
+from belief_store import placement_codes
+
+
+# digits in a FEN placement expand to that many empty squares, '/' separators disappear
+PLACEMENT_EXPANSION = {ord(str(n)): '.' * n for n in range(1, 9)}
+PLACEMENT_EXPANSION[ord('/')] = None
+
+
+def piece_code(piece):
+    # 0 for an empty square, 1-6 white pawn..king, 7-12 black pawn..king
+    if piece is None:
+        return 0
+    return piece.piece_type if piece.color == chess.WHITE else piece.piece_type + 6
+
+
+def placement_index(square):
+    # position of `square` in an expanded placement string, which runs a8..h8 down to a1..h1
+    return (7 - chess.square_rank(square)) * 8 + chess.square_file(square)
+
+
+class SenseObservation:
+    # a sense window compiled once per sense: bitboards for Board checks, expected characters for raw FEN
+    # checks and a piece-code array for encoded belief stores
+    def __init__(self, sense_result):
+        self.sense_result = list(sense_result)
+        self.squares = np.array([square for square, _ in self.sense_result], dtype=np.int64)
+        self.codes = np.array([piece_code(piece) for _, piece in self.sense_result], dtype=np.int8)
+        self.expected = [(placement_index(square), piece.symbol() if piece else '.')
+                         for square, piece in self.sense_result]
+
+        self.mask = 0
+        self.occupied = 0
+        pieces = {}
+        for square, piece in self.sense_result:
+            self.mask |= chess.BB_SQUARES[square]
+            if piece is not None:
+                self.occupied |= chess.BB_SQUARES[square]
+                key = (piece.color, piece.piece_type)
+                pieces[key] = pieces.get(key, 0) | chess.BB_SQUARES[square]
+        self.pieces = [(color, piece_type, bb) for (color, piece_type), bb in pieces.items()]
+
+    def __bool__(self):
+        return bool(self.sense_result)
+
+    def mismatch(self, board):
+        # window squares where `board` disagrees with what we saw
+        diff = (board.occupied & self.mask) ^ self.occupied
+        for color, piece_type, bb in self.pieces:
+            diff |= (board.pieces_mask(piece_type, color) & self.mask) ^ bb
+        return diff
+
+    def matches(self, board):
+        if board.occupied & self.mask != self.occupied:
+            return False
+        return all(board.pieces_mask(piece_type, color) & self.mask == bb for color, piece_type, bb in self.pieces)
+
+    def matches_fen(self, fen):
+        placement = fen.split(' ', 1)[0].translate(PLACEMENT_EXPANSION)
+        return all(placement[index] == symbol for index, symbol in self.expected)
+
+    def matches_codes(self, codes):
+        # vectorized over an (N, 64) array of piece codes
+        return (codes[:, self.squares] == self.codes).all(axis=1)
+
+
+def filter_sense(states, observation):
+    return [fen for fen in states if observation.matches_fen(fen)]
+
+
+class BoardPool:
+    # per-turn cache of parsed boards keyed by FEN; get() hands out a shared board that must not be mutated,
+    # copy() gives a private board for anything that pushes moves
+    def __init__(self):
+        self.boards = {}
+        self.valid = {}
+        self.parses = 0
+        self.hits = 0
+        self.lock = Lock()
+
+    def get(self, fen):
+        board = self.boards.get(fen)
+        if board is not None:
+            self.hits += 1
+            return board
+        board = chess.Board(fen)
+        with self.lock:
+            self.parses += 1
+            return self.boards.setdefault(fen, board)
+
+    def copy(self, fen):
+        return self.get(fen).copy(stack=False)
+
+    def is_valid(self, fen):
+        valid = self.valid.get(fen)
+        if valid is None:
+            try:
+                valid = self.get(fen).is_valid()
+            except ValueError:
+                valid = False
+            self.valid[fen] = valid
+        return valid
+
+    def clear(self):
+        self.boards.clear()
+        self.valid.clear()
+        self.parses = 0
+        self.hits = 0
+
+
+def parse_board(fen, boards=None):
+    return boards.copy(fen) if boards is not None else chess.Board(fen)
+
+
+def expand_states(states, successors):
+    for state in states:
+        yield from successors(state)
+
+
+def filter_states(states, keep):
+    return (state for state in states if keep(state))
+
+
+def sample_distinct(states, cap, rng=random):
+    # bottom-k sampling on a salted hash: duplicates share a key, so this dedups and samples
+    # uniformly over distinct states while never holding more than `cap` of them. The hash is keyed
+    # blake2b rather than hash(), whose per-process string salt would make seeded runs differ
+    if cap is None:
+        return list(dict.fromkeys(states))
+
+    salt = rng.getrandbits(64).to_bytes(8, 'little')
+    heap = []
+    kept = set()
+    for state in states:
+        if state in kept:
+            continue
+        key = int.from_bytes(hashlib.blake2b(state.encode(), digest_size=8, key=salt).digest(), 'little')
+        if len(heap) < cap:
+            heapq.heappush(heap, (-key, state))
+            kept.add(state)
+        elif key < -heap[0][0]:
+            _, dropped = heapq.heapreplace(heap, (-key, state))
+            kept.discard(dropped)
+            kept.add(state)
+    return [state for _, state in heap]
+
+
+def update_belief(states, successors, keep=None, cap=None, rng=random):
+    # expand -> constraint-filter -> dedup/reservoir-sample, without materializing the expanded list
+    stream = expand_states(states, successors)
+    if keep is not None:
+        stream = filter_states(stream, keep)
+    return sample_distinct(stream, cap, rng)
+
+
+def opponent_moves(board, capture_square=None, from_mask=chess.BB_ALL, to_mask=chess.BB_ALL):
+    # legal opponent moves that agree with the capture report: none of our pieces taken, or one taken on
+    # capture_square; the report narrows to_mask so ruled-out moves are never generated. As white, the first
+    # report arrives before the opponent has moved at all, so the agents skip expanding it
+    if capture_square is None:
+        to_mask &= ~board.occupied_co[not board.turn]
+    else:
+        to_mask &= chess.BB_SQUARES[capture_square]
+        if board.ep_square is not None:
+            to_mask |= chess.BB_SQUARES[board.ep_square] & chess.BB_ALL
+    for move in board.generate_legal_moves(from_mask, to_mask):
+        if capture_square_of_move(board, move) == capture_square:
+            yield move
+
+
+def opponent_move_successors(fen, capture_square=None, boards=None):
+    board = parse_board(fen, boards)
+    next_positions = []
+    for move in opponent_moves(board, capture_square):
+        board.push(move)
+        next_positions.append(board.fen())
+        board.pop()
+
+    next_positions.sort()
+    return next_positions
+
+
+def sense_consistent_successors(fen, observation, capture_square=None, boards=None):
+    # expands one opponent move, generating only children that can agree with the sense window
+    board = parse_board(fen, boards)
+    mismatch = observation.mismatch(board)
+
+    if mismatch:
+        # a single move changes at most four squares (castling), and it has to touch every mismatch
+        if chess.popcount(mismatch) > 4:
+            return []
+        moves = set(opponent_moves(board, capture_square, from_mask=mismatch))
+        moves.update(opponent_moves(board, capture_square, to_mask=mismatch))
+        if board.ep_square is not None:
+            moves.update(opponent_moves(board, capture_square, to_mask=chess.BB_SQUARES[board.ep_square]))
+        if capture_square is None:
+            moves.update(board.generate_castling_moves())
+    else:
+        # the window already matches, so the move has to stay clear of it
+        outside = ~observation.mask & chess.BB_ALL
+        moves = opponent_moves(board, capture_square, from_mask=outside, to_mask=outside)
+
+    children = []
+    for move in moves:
+        board.push(move)
+        if observation.matches(board):
+            children.append(board.fen())
+        board.pop()
+
+    children.sort()
+    return children
+
+
+def move_feedback_successor(fen, requested_move, taken_move, capture_square, boards=None):
+    # keeps the state only if our requested move would have been revised into exactly what we observed
+    board = parse_board(fen, boards)
+    if requested_move is not None:
+        if board.piece_at(requested_move.from_square) is None:
+            return []
+        if revise_move(board, add_pawn_queen_promotion(board, requested_move)) != taken_move:
+            return []
+    if capture_square_of_move(board, taken_move) != capture_square:
+        return []
+
+    board.push(taken_move if taken_move is not None else chess.Move.null())
+    return [board.fen()]
+
+
+def apply_move_feedback(states, requested_move, taken_move, capture_square, boards=None):
+    return list(expand_states(states, lambda fen: move_feedback_successor(fen, requested_move, taken_move,
+                                                                          capture_square, boards)))
+
+
+def apply_own_capture(states, taken_move, capture_square, boards=None):
+    # our capture is known: keep states with an opponent piece on capture_square in which taken_move is a
+    # capture we could make, checked for the whole belief set at once on the belief store's piece codes;
+    # boards are only built for survivors, to apply taken_move
+    states = list(states)
+    if not states:
+        return []
+    codes = placement_codes(states)
+    white = np.array([fen.split(' ', 2)[1] == 'w' for fen in states])
+    captured = codes[:, capture_square]
+    keep = np.where(white, captured > 6, (captured >= 1) & (captured <= 6)) & (codes[:, taken_move.from_square] != 0)
+    between = list(chess.SquareSet(chess.between(taken_move.from_square, taken_move.to_square)))
+    if between:
+        keep &= (codes[:, between] == 0).all(axis=1)
+    next_states = []
+    for i in np.flatnonzero(keep):
+        board = parse_board(states[i], boards)
+        if not board.is_pseudo_legal(taken_move):
+            continue
+        board.push(taken_move)
+        next_states.append(board.fen())
+    return next_states
@@ -0,0 +1,82 @@
+import chess
+import numpy as np
+from belief_store import encode_states, piece_codes
+
+# per-square marginals over the belief set: probs[square, code] is the weighted share of states with piece
+# `code` (see belief.piece_code) on `square`, so one 64x13 table summarises thousands of hypotheses
+
+PIECES = [None] + [chess.Piece(piece_type, color) for color in (chess.WHITE, chess.BLACK)
+                   for piece_type in chess.PIECE_TYPES]
+KING_CODES = {chess.WHITE: chess.KING, chess.BLACK: chess.KING + 6}
+
+
+def marginals(codes, weights=None):
+    weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+    probs = np.zeros((64, 13))
+    for code in range(13):
+        probs[:, code] = weights @ (codes == code)
+    return probs / weights.sum()
+
+
+def entropy(probs):
+    # bits of uncertainty per square, 0 where every state agrees
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -np.where(probs > 0, probs * np.log2(probs), 0.0).sum(axis=1)
+
+
+class BeliefMap:
+    def __init__(self, probs):
+        self.probs = probs
+        self.entropy = entropy(probs)
+        self.occupancy = 1.0 - probs[:, 0]
+        self.likely_codes = self.resolve_kings(probs.argmax(axis=1))
+        self.cached_board = None
+
+    @classmethod
+    def from_states(cls, states, weights=None):
+        states = list(states)
+        if not states:
+            return None
+        return cls.from_records(encode_states(states, weights))
+
+    @classmethod
+    def from_records(cls, records):
+        if len(records) == 0:
+            return None
+        return cls(marginals(piece_codes(records), records['weight']))
+
+    def resolve_kings(self, codes):
+        # a per-square argmax can put a king on several squares or on none; each king goes on the square where
+        # it is most likely, and other squares the argmax gave it fall back to their best non-king code
+        codes = codes.copy()
+        taken = set()
+        for king in KING_CODES.values():
+            if not self.probs[:, king].any():
+                continue
+            ranked = [square for square in np.argsort(-self.probs[:, king], kind='stable') if square not in taken]
+            square = ranked[0]
+            for other in np.flatnonzero(codes == king):
+                if other != square:
+                    codes[other] = next(code for code in np.argsort(-self.probs[other], kind='stable')
+                                        if code not in KING_CODES.values())
+            codes[square] = king
+            taken.add(square)
+        return codes
+
+    def piece_probability(self, square, piece):
+        return self.probs[square, 0 if piece is None else PIECES.index(piece)]
+
+    def board(self, turn):
+        # most likely board; a fresh copy each call, callers are free to push moves on it
+        if self.cached_board is None:
+            board = chess.Board(None)
+            for square, code in enumerate(self.likely_codes):
+                if code:
+                    board.set_piece_at(square, PIECES[code])
+            self.cached_board = board
+        board = self.cached_board.copy(stack=False)
+        board.turn = turn
+        return board
+
+    def uncertain_squares(self, threshold=0.5):
+        return [square for square in chess.SQUARES if self.entropy[square] >= threshold]
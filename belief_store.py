@@ -0,0 +1,125 @@
+import re
+import chess
+import numpy as np
+
+# snapshot layout: 16 byte header (magic, version, reserved, record count) followed by fixed-size records,
+# so a file can be memory-mapped and read through NumPy without copying
+MAGIC = b'RBCB'
+VERSION = 1
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('reserved', '<u2'), ('count', '<u8')])
+RECORD = np.dtype([
+    ('board', 'u1', 32),  # 64 piece codes (see belief.piece_code), two per byte, a1 first
+    ('turn', 'u1'),
+    ('castling', 'u1'),  # bit 0..3 = K, Q, k, q
+    ('ep', 'u1'),  # en passant square, 255 for none
+    ('halfmove', 'u1'),
+    ('fullmove', '<u2'),
+    ('weight', '<f4'),
+])
+NO_EP = 255
+
+SYMBOLS = np.frombuffer(b'.PNBRQKpnbrqk', dtype=np.uint8)
+CODE_OF_SYMBOL = np.zeros(256, dtype=np.uint8)
+CODE_OF_SYMBOL[SYMBOLS] = np.arange(len(SYMBOLS), dtype=np.uint8)
+CASTLING_FLAGS = 'KQkq'
+
+# expanded placement strings run a8..h8 down to a1..h1; this reorders them to square order
+PLACEMENT_TO_SQUARE = np.array([(7 - chess.square_rank(square)) * 8 + chess.square_file(square)
+                                for square in chess.SQUARES])
+SQUARE_TO_PLACEMENT = np.argsort(PLACEMENT_TO_SQUARE)
+EXPANSION = {ord(str(n)): '.' * n for n in range(1, 9)}
+EXPANSION[ord('/')] = None
+EMPTY_RUN = re.compile(r'\.+')
+
+
+def placement_codes(placements):
+    # (N, 64) piece codes indexed by chess square from FEN placement fields (or whole FENs), no Board needed
+    placements = [placement.split(' ', 1)[0].translate(EXPANSION) for placement in placements]
+    codes = CODE_OF_SYMBOL[np.frombuffer(''.join(placements).encode(), dtype=np.uint8)]
+    return codes.reshape(len(placements), 64)[:, PLACEMENT_TO_SQUARE]
+
+
+def encode_states(fens, weights=None):
+    fens = list(fens)
+    records = np.zeros(len(fens), dtype=RECORD)
+    if not fens:
+        return records
+
+    fields = [fen.split(' ') for fen in fens]
+    codes = placement_codes(field[0] for field in fields)
+    records['board'] = codes[:, 0::2] | (codes[:, 1::2] << 4)
+
+    records['turn'] = [field[1] == 'w' for field in fields]
+    records['castling'] = [sum(1 << i for i, flag in enumerate(CASTLING_FLAGS) if flag in field[2])
+                           for field in fields]
+    records['ep'] = [NO_EP if field[3] == '-' else chess.parse_square(field[3]) for field in fields]
+    records['halfmove'] = [min(int(field[4]), 255) if len(field) > 4 else 0 for field in fields]
+    records['fullmove'] = [int(field[5]) if len(field) > 5 else 1 for field in fields]
+    records['weight'] = 1.0 if weights is None else weights
+    return records
+
+
+def piece_codes(records):
+    # (N, 64) piece codes indexed by chess square, decoded straight from the packed board bytes
+    packed = records['board']
+    codes = np.empty((len(records), 64), dtype=np.uint8)
+    codes[:, 0::2] = packed & 0x0F
+    codes[:, 1::2] = packed >> 4
+    return codes
+
+
+def decode_states(records):
+    if len(records) == 0:
+        return []
+    placements = SYMBOLS[piece_codes(records)[:, SQUARE_TO_PLACEMENT]].tobytes().decode()
+
+    fens = []
+    for i, record in enumerate(records):
+        rows = [placements[i * 64 + rank * 8:i * 64 + rank * 8 + 8] for rank in range(8)]
+        board_fen = '/'.join(EMPTY_RUN.sub(lambda run: str(len(run.group())), row) for row in rows)
+        castling = ''.join(flag for bit, flag in enumerate(CASTLING_FLAGS) if record['castling'] >> bit & 1) or '-'
+        ep = '-' if record['ep'] == NO_EP else chess.SQUARE_NAMES[record['ep']]
+        fens.append(f"{board_fen} {'w' if record['turn'] else 'b'} {castling} {ep} "
+                    f"{record['halfmove']} {record['fullmove']}")
+    return fens
+
+
+def to_bytes(records):
+    header = np.array([(MAGIC, VERSION, 0, len(records))], dtype=HEADER)
+    return header.tobytes() + np.ascontiguousarray(records, dtype=RECORD).tobytes()
+
+
+def from_bytes(data):
+    # zero-copy view over a snapshot held in memory, e.g. a shard handed to a worker process
+    header = np.frombuffer(data, dtype=HEADER, count=1)[0]
+    check_header(header)
+    return np.frombuffer(data, dtype=RECORD, count=int(header['count']), offset=HEADER.itemsize)
+
+
+def check_header(header):
+    if header['magic'] != MAGIC:
+        raise ValueError('Not a belief snapshot')
+    if header['version'] != VERSION:
+        raise ValueError(f"Unsupported belief snapshot version {header['version']}")
+
+
+def save_snapshot(path, fens, weights=None):
+    records = encode_states(fens, weights)
+    with open(path, 'wb') as f:
+        f.write(to_bytes(records))
+    return records
+
+
+def load_snapshot(path, mmap=True):
+    if not mmap:
+        with open(path, 'rb') as f:
+            return from_bytes(f.read())
+    header = np.fromfile(path, dtype=HEADER, count=1)[0]
+    check_header(header)
+    if header['count'] == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.itemsize, shape=(int(header['count']),))
+
+
+def shard_snapshot(records, shards):
+    return [to_bytes(part) for part in np.array_split(records, shards)]
@@ -0,0 +1,60 @@
+import chess
+import numpy as np
+from king_danger import state_codes
+from search import evaluate
+
+# groups belief states that look the same around our king and along a few candidate moves; states that only
+# differ in far-away opponent pieces share a cluster, and the engine sees one or a few representatives of it
+
+
+def candidate_moves(board, moves, limit=4):
+    # the few moves worth telling states apart for: best one-ply search.evaluate scores on the likely board
+    scored = []
+    for move in moves:
+        if not board.is_pseudo_legal(move):
+            continue
+        board.push(move)
+        scored.append((evaluate(board), move.uci(), move))
+        board.pop()
+    return [move for _, _, move in sorted(scored)[:limit]]
+
+
+def relevant_squares(color, king_square, moves):
+    # our king and its neighbours plus the squares the candidate moves pass through or land on; keep `moves`
+    # short (see candidate_moves), every sliding move adds a line of squares to the key
+    mask = 0
+    if king_square is not None:
+        mask |= chess.BB_SQUARES[king_square] | chess.BB_KING_ATTACKS[king_square]
+    for move in moves:
+        mask |= chess.BB_SQUARES[move.to_square] | chess.between(move.from_square, move.to_square)
+    return list(chess.SquareSet(mask))
+
+
+def material(codes):
+    # (N, 13) piece counts per code
+    counts = np.zeros((len(codes), 13), dtype=np.uint8)
+    for piece in range(1, 13):
+        counts[:, piece] = (codes == piece).sum(axis=1)
+    return counts
+
+
+def cluster_states(states, squares, representatives=1):
+    # returns (representative states, weights); each cluster's weight is its size, split evenly over the
+    # representatives drawn from it, so the weights sum to len(states)
+    states = list(states)
+    if not states:
+        return [], []
+    codes = state_codes(states)
+    keys = np.concatenate([codes[:, squares], material(codes)], axis=1)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+
+    chosen, weights = [], []
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    for start, size in zip(starts, counts):
+        members = order[start:start + min(representatives, size)]
+        for index in members:
+            chosen.append(states[index])
+            weights.append(size / len(members))
+    return chosen, weights
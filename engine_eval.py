@@ -0,0 +1,120 @@
+import chess
+import chess.engine
+import numpy as np
+from collections import Counter
+
+MATE_SCORE = 100000
+
+
+def score_value(score, color):
+    # centipawns from `color`'s point of view, mates mapped onto a large finite value
+    if score is None:
+        return 0
+    return score.pov(color).score(mate_score=MATE_SCORE)
+
+
+def multipv_candidates(engine, board, limit, multipv, color, root_moves=None):
+    # one analyse call returns the top-K (move, score) pairs for a single state
+    infos = engine.analyse(board, limit, multipv=multipv, root_moves=root_moves)
+    if isinstance(infos, dict):
+        infos = [infos]
+
+    candidates = []
+    for info in infos:
+        pv = info.get('pv')
+        if not pv:
+            continue
+        candidates.append((pv[0], score_value(info.get('score'), color)))
+    return candidates
+
+
+def aggregate_candidates(candidate_lists, weights=None):
+    # votes count how often a move is the top choice, totals sum its score over every state it appears in;
+    # with weights, each list counts as that many states (e.g. a cluster representative)
+    votes = Counter()
+    totals = Counter()
+    seen = Counter()
+    for i, candidates in enumerate(candidate_lists):
+        if not candidates:
+            continue
+        weight = 1 if weights is None else weights[i]
+        votes[candidates[0][0].uci()] += weight
+        for move, score in candidates:
+            totals[move.uci()] += score * weight
+            seen[move.uci()] += weight
+    return votes, totals, seen
+
+
+def expected_scores(candidate_lists, weights=None):
+    # weighted mean score of every listed move over all evaluated states; a move missing from a state's top-K
+    # is charged that state's lowest listed score, the best it could have had
+    moves = {move.uci() for candidates in candidate_lists for move, _ in candidates}
+    totals = Counter()
+    total_weight = 0
+    for i, candidates in enumerate(candidate_lists):
+        if not candidates:
+            continue
+        weight = 1 if weights is None else weights[i]
+        scores = {move.uci(): score for move, score in candidates}
+        floor = min(scores.values())
+        for move in moves:
+            totals[move] += scores.get(move, floor) * weight
+        total_weight += weight
+    return {move: totals[move] / total_weight for move in moves}
+
+
+def best_voted_move(votes, totals):
+    # most top-1 votes first, ties broken by the expected score instead of re-querying
+    if not votes:
+        return None
+    best = sorted(votes, key=lambda move: (-votes[move], -totals[move], move))[0]
+    return chess.Move.from_uci(best)
+
+
+def root_move_row(engine, board, moves, limit, color):
+    # scores one state for our candidate moves only; NaN marks moves that would be revised or rejected
+    scores = np.full(len(moves), np.nan)
+    king_risk = np.zeros(len(moves), dtype=bool)
+    enemy_king = board.king(not color)
+
+    legal = []
+    for j, move in enumerate(moves):
+        if move.to_square == enemy_king and board.is_pseudo_legal(move):
+            scores[j] = MATE_SCORE
+        elif board.is_legal(move):
+            legal.append(move)
+        elif board.is_pseudo_legal(move):
+            # RBC allows moving into check, the opponent simply takes the king
+            scores[j] = -MATE_SCORE
+            king_risk[j] = True
+
+    if legal and board.is_valid():
+        index = {move: j for j, move in enumerate(moves)}
+        for move, score in multipv_candidates(engine, board, limit, len(legal), color, root_moves=legal):
+            if move in index:
+                scores[index[move]] = score
+    return scores, king_risk
+
+
+def aggregate_matrix(scores, king_risk, weights=None, min_coverage=0.0):
+    # collapses a states x moves matrix into expected score, worst case and king-capture risk per move;
+    # a NaN entry is charged that state's lowest score, as in expected_scores, and moves scored in less than
+    # `min_coverage` of the weight are left out (NaN)
+    weights = np.ones(scores.shape[0]) if weights is None else np.asarray(weights, dtype=float)
+    valid = ~np.isnan(scores)
+    covered = (weights[:, None] * valid).sum(axis=0)
+    risk = (king_risk * weights[:, None]).sum(axis=0) / weights.sum()
+
+    # states where every move is NaN say nothing about the moves and are left out
+    scored = valid.any(axis=1)
+    floor = np.where(valid, scores, np.inf).min(axis=1)
+    charged = np.where(valid, scores, floor[:, None])[scored]
+    if not scored.any():
+        return np.full(scores.shape[1], np.nan), np.full(scores.shape[1], np.nan), risk
+
+    expected = weights[scored] @ charged / weights[scored].sum()
+    worst = charged.min(axis=0)
+    dropped = (covered == 0) | (covered < min_coverage * weights.sum())
+    expected[dropped] = np.nan
+    worst[dropped] = np.nan
+    return expected, worst, risk
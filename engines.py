@@ -0,0 +1,254 @@
+import os
+import json
+import shlex
+import logging
+import threading
+import concurrent.futures
+import chess
+import chess.engine
+
+# One place for agents to get their engine.
+#   RBC_ENGINE       command to run instead of the agent's Stockfish path, e.g. "python stub_engine.py --latency 0.01"
+#   RBC_ENGINE_MODE  "record" writes every engine answer to RBC_ENGINE_LOG, "replay" answers from that log and
+#                    starts no process at all
+#   RBC_ENGINE_LOG   JSON-lines log for record/replay, engine_log.jsonl by default
+ENGINE_PATH = './opt/stockfish/stockfish'
+
+
+def engine_command(path=ENGINE_PATH):
+    command = os.environ.get('RBC_ENGINE')
+    return shlex.split(command) if command else path
+
+
+def open_engine(path=ENGINE_PATH):
+    mode = os.environ.get('RBC_ENGINE_MODE')
+    log = os.environ.get('RBC_ENGINE_LOG', 'engine_log.jsonl')
+    if mode == 'replay':
+        return ReplayEngine(log)
+    engine = SupervisedEngine(lambda: chess.engine.SimpleEngine.popen_uci(engine_command(path), setpgrp=True))
+    if mode == 'record':
+        return RecordingEngine(engine, log)
+    return engine
+
+
+class SupervisedEngine:
+    # owns the engine process: one command at a time (SimpleEngine cancels a running command when another
+    # thread starts a new one), a watchdog per call, and a restart with the recorded options after a crash or
+    # hang; the failed call is retried once on the fresh process
+    def __init__(self, factory, grace=5.0, call_timeout=30.0, max_restarts=10):
+        self.factory = factory
+        self.grace = grace
+        self.call_timeout = call_timeout
+        self.max_restarts = max_restarts
+        self.options = {}
+        self.crashes = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.hung = None
+        self.lock = threading.RLock()
+        self.engine = None
+        self.start()
+
+    def start(self):
+        self.engine = self.factory()
+        if self.options:
+            self.engine.configure(self.options)
+
+    def restart(self):
+        self.stop()
+        if self.restarts >= self.max_restarts:
+            raise chess.engine.EngineTerminatedError(f'Engine given up after {self.restarts} restarts')
+        self.restarts += 1
+        logging.warning(f'Restarting engine (crashes: {self.crashes}, timeouts: {self.timeouts})')
+        self.start()
+
+    def stop(self):
+        engine, self.engine = self.engine, None
+        if engine is not None:
+            try:
+                engine.close()
+            except Exception:
+                pass
+
+    def deadline(self, limit):
+        if limit is not None and limit.time is not None:
+            return limit.time + self.grace
+        return self.call_timeout
+
+    def kill(self, engine):
+        self.hung = engine
+        engine.close()
+
+    def call(self, method, limit, *args, **kwargs):
+        with self.lock:
+            failure = None
+            for _ in range(2):
+                if self.engine is None:
+                    raise failure or chess.engine.EngineTerminatedError('Engine is not running')
+                engine = self.engine
+                watchdog = threading.Timer(self.deadline(limit), self.kill, args=(engine,))
+                watchdog.daemon = True
+                watchdog.start()
+                try:
+                    return getattr(engine, method)(*args, **kwargs)
+                except (chess.engine.EngineTerminatedError, TimeoutError, concurrent.futures.CancelledError) as e:
+                    failure = e
+                    if self.hung is engine:
+                        self.timeouts += 1
+                    else:
+                        self.crashes += 1
+                    self.restart()
+                finally:
+                    watchdog.cancel()
+            raise failure
+
+    def play(self, board, limit, **kwargs):
+        return self.call('play', limit, board, limit, **kwargs)
+
+    def analyse(self, board, limit, multipv=None, **kwargs):
+        return self.call('analyse', limit, board, limit, multipv=multipv, **kwargs)
+
+    def configure(self, options):
+        self.options.update(options)
+        return self.call('configure', None, options)
+
+    def ping(self):
+        return self.call('ping', None)
+
+    def quit(self):
+        # safe on a dead or hung engine, so handle_game_end never raises because of it
+        with self.lock:
+            engine, self.engine = self.engine, None
+        if engine is None:
+            return
+        try:
+            engine.quit()
+        except Exception:
+            engine.close()
+
+    def close(self):
+        self.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.quit()
+
+    def __getattr__(self, name):
+        if name == 'engine':
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+
+def request_key(method, board, multipv=None, root_moves=None):
+    # time limits are left out on purpose: a replay has to answer the same question asked with another budget
+    moves = sorted(move.uci() for move in root_moves) if root_moves else None
+    return json.dumps([method, board.fen(), multipv, moves])
+
+
+def encode_score(score):
+    if score is None:
+        return None
+    white = score.white()
+    return {'mate': white.mate()} if white.is_mate() else {'cp': white.score()}
+
+
+def decode_score(data):
+    if data is None:
+        return None
+    score = chess.engine.Mate(data['mate']) if 'mate' in data else chess.engine.Cp(data['cp'])
+    return chess.engine.PovScore(score, chess.WHITE)
+
+
+def encode_info(info):
+    return {'score': encode_score(info.get('score')), 'pv': [move.uci() for move in info.get('pv', [])]}
+
+
+def decode_info(data):
+    info = {}
+    if data['score'] is not None:
+        info['score'] = decode_score(data['score'])
+    if data['pv']:
+        info['pv'] = [chess.Move.from_uci(uci) for uci in data['pv']]
+    return info
+
+
+class RecordingEngine:
+    # passes calls through to a real engine and appends each answer to a JSON-lines log
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, key, response):
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps({'key': key, 'response': response}) + '\n')
+
+    def play(self, board, limit, **kwargs):
+        result = self.engine.play(board, limit, **kwargs)
+        self.write(request_key('play', board, root_moves=kwargs.get('root_moves')),
+                   {'move': result.move.uci() if result.move else None, 'info': encode_info(result.info)})
+        return result
+
+    def analyse(self, board, limit, multipv=None, **kwargs):
+        infos = self.engine.analyse(board, limit, multipv=multipv, **kwargs)
+        recorded = [encode_info(info) for info in infos] if multipv is not None else encode_info(infos)
+        self.write(request_key('analyse', board, multipv, kwargs.get('root_moves')), recorded)
+        return infos
+
+    def quit(self):
+        self.engine.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.quit()
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+
+class ReplayEngine:
+    # answers play/analyse from a recorded log; a question that was never recorded is an EngineError
+    def __init__(self, path):
+        self.responses = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.responses[record['key']] = record['response']
+
+    def lookup(self, key):
+        try:
+            return self.responses[key]
+        except KeyError:
+            raise chess.engine.EngineError(f'No recorded engine response for {key}')
+
+    def play(self, board, limit, **kwargs):
+        response = self.lookup(request_key('play', board, root_moves=kwargs.get('root_moves')))
+        move = chess.Move.from_uci(response['move']) if response['move'] else None
+        return chess.engine.PlayResult(move, None, decode_info(response['info']))
+
+    def analyse(self, board, limit, multipv=None, **kwargs):
+        response = self.lookup(request_key('analyse', board, multipv, kwargs.get('root_moves')))
+        return [decode_info(info) for info in response] if multipv is not None else decode_info(response)
+
+    def configure(self, options):
+        pass
+
+    def ping(self):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.quit()
@@ -0,0 +1,113 @@
+import chess
+import numpy as np
+from belief_store import encode_states, piece_codes
+
+# batch attack detection over an (N, 64) piece-code array (see belief.piece_code), one row per belief state,
+# so king captures and king threats are found for the whole belief set without building a Board per state
+
+KNIGHT_SQUARES = [list(chess.SquareSet(chess.BB_KNIGHT_ATTACKS[square])) for square in chess.SQUARES]
+KING_SQUARES = [list(chess.SquareSet(chess.BB_KING_ATTACKS[square])) for square in chess.SQUARES]
+DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def ray(square, file_step, rank_step):
+    squares = []
+    file, rank = chess.square_file(square) + file_step, chess.square_rank(square) + rank_step
+    while 0 <= file < 8 and 0 <= rank < 8:
+        squares.append(chess.square(file, rank))
+        file, rank = file + file_step, rank + rank_step
+    return squares
+
+
+# RAYS[square] = [(outward squares, diagonal?)] for every direction with at least one square
+RAYS = [[(ray(square, df, dr), df != 0 and dr != 0) for df, dr in DIRECTIONS if ray(square, df, dr)]
+        for square in chess.SQUARES]
+
+
+def code(color, piece_type):
+    return piece_type if color == chess.WHITE else piece_type + 6
+
+
+def state_codes(states):
+    return piece_codes(encode_states(states))
+
+
+def own_pieces(codes, color):
+    return (codes >= 1) & (codes <= 6) if color == chess.WHITE else codes >= 7
+
+
+def king_attackers(codes, color):
+    # (N, 64) mask of `not color` pieces attacking `color`'s king in each state; states without that king have none
+    enemy = not color
+    attackers = np.zeros(codes.shape, dtype=bool)
+    kings = codes == code(color, chess.KING)
+    has_king, king_squares = kings.any(axis=1), kings.argmax(axis=1)
+
+    for king_square in np.unique(king_squares[has_king]):
+        rows = np.flatnonzero(has_king & (king_squares == king_square))
+        block = codes[rows]
+        hits = np.zeros((len(rows), 64), dtype=bool)
+
+        leapers = [(KNIGHT_SQUARES[king_square], code(enemy, chess.KNIGHT)),
+                   (KING_SQUARES[king_square], code(enemy, chess.KING)),
+                   # a pawn of ours on the king square would attack exactly where enemy pawns attack it from
+                   (list(chess.SquareSet(chess.BB_PAWN_ATTACKS[color][king_square])), code(enemy, chess.PAWN))]
+        for squares, piece in leapers:
+            if squares:
+                hits[:, squares] |= block[:, squares] == piece
+
+        for squares, diagonal in RAYS[king_square]:
+            line = block[:, squares]
+            occupied = line != 0
+            first = occupied.argmax(axis=1)
+            blocker = line[np.arange(len(rows)), first]
+            slider = code(enemy, chess.BISHOP if diagonal else chess.ROOK)
+            attacking = occupied.any(axis=1) & ((blocker == slider) | (blocker == code(enemy, chess.QUEEN)))
+            hits[np.flatnonzero(attacking), np.asarray(squares)[first[attacking]]] = True
+
+        attackers[rows] = hits
+    return attackers
+
+
+def capture_hits(codes, color, move, targets):
+    # (N,) rows where `move` is a capture landing on a square marked in the (N, 64) `targets` mask
+    if move.from_square == move.to_square:
+        return np.zeros(len(codes), dtype=bool)
+    mover = codes[:, move.from_square]
+    hits = own_pieces(codes, color)[:, move.from_square] & targets[:, move.to_square]
+    file_step = abs(chess.square_file(move.from_square) - chess.square_file(move.to_square))
+    # pawn pushes and castling never capture
+    hits &= ~((mover == code(color, chess.PAWN)) & (file_step == 0))
+    hits &= ~((mover == code(color, chess.KING)) & (file_step == 2))
+    between = list(chess.SquareSet(chess.between(move.from_square, move.to_square)))
+    if between:
+        hits &= (codes[:, between] == 0).all(axis=1)
+    return hits
+
+
+def king_capture_rates(codes, color, moves):
+    # share of states in which each move takes the enemy king
+    enemy_king = codes == code(not color, chess.KING)
+    return {move: capture_hits(codes, color, move, enemy_king).mean() for move in moves}
+
+
+def decisive_move(states, color, move_actions, threshold=0.5):
+    # returns (move, reason) when the belief set alone decides the turn, (None, None) otherwise:
+    # first a king capture that works in at least `threshold` of the states, then a capture of the piece
+    # threatening our king if enough states agree on it. The agents ask it before any engine call
+    codes = state_codes(states)
+    if len(codes) == 0:
+        return None, None
+
+    rates = king_capture_rates(codes, color, move_actions)
+    best = max(rates, key=rates.get, default=None)
+    if best is not None and rates[best] >= threshold:
+        return best, 'king capture'
+
+    attackers = king_attackers(codes, color)
+    if attackers.any(axis=1).mean() >= threshold:
+        rates = {move: capture_hits(codes, color, move, attackers).mean() for move in move_actions}
+        best = max(rates, key=rates.get, default=None)
+        if best is not None and rates[best] >= threshold:
+            return best, 'king defence'
+    return None, None
@@ -0,0 +1,189 @@
+import sys
+import glob
+import argparse
+import chess
+import chess.engine
+import numpy as np
+from belief_store import RECORD, NO_EP, piece_codes, decode_states
+from engine_eval import score_value
+
+# Small NumPy position evaluator fitted on selfplay.py shards: piece-square one-hot features into a linear model
+# or a one-hidden-layer MLP. Scores are from white's point of view on the game-outcome scale (-1 loss .. 1 win),
+# optionally blended with tanh-squashed engine scores, and a whole belief set is scored in one batched pass.
+
+FEATURES = 12 * 64
+ENGINE_SCALE = 400.0
+
+
+def features(codes):
+    # (N, 768) one-hot of piece code 1..12 on each square; empty squares contribute nothing
+    codes = np.asarray(codes)
+    x = np.zeros((len(codes), FEATURES), dtype=np.float32)
+    rows, squares = np.nonzero(codes)
+    x[rows, (codes[rows, squares].astype(np.int64) - 1) * 64 + squares] = 1.0
+    return x
+
+
+class Evaluator:
+    def __init__(self, hidden=0, seed=0):
+        rng = np.random.default_rng(seed)
+        self.hidden = hidden
+        if hidden:
+            self.w1 = (rng.standard_normal((FEATURES, hidden)) * np.sqrt(2.0 / FEATURES)).astype(np.float32)
+            self.b1 = np.zeros(hidden, dtype=np.float32)
+            self.w2 = (rng.standard_normal(hidden) * np.sqrt(1.0 / hidden)).astype(np.float32)
+        else:
+            self.w2 = np.zeros(FEATURES, dtype=np.float32)
+        self.b2 = np.float32(0.0)
+
+    def forward(self, x):
+        if not self.hidden:
+            return x @ self.w2 + self.b2, None
+        h = np.maximum(x @ self.w1 + self.b1, 0.0)
+        return h @ self.w2 + self.b2, h
+
+    def predict(self, codes):
+        return np.tanh(self.forward(features(codes))[0])
+
+    def score(self, codes, color):
+        # batched scores from `color`'s point of view
+        scores = self.predict(codes)
+        return scores if color == chess.WHITE else -scores
+
+    def fit(self, codes, targets, epochs=20, batch=1024, rate=1e-3, l2=1e-4, seed=0):
+        # mean squared error on tanh(output) with Adam; the linear model is the hidden=0 case of the same loop
+        x, y = features(codes), np.asarray(targets, dtype=np.float32)
+        params = ['w2', 'b2'] + (['w1', 'b1'] if self.hidden else [])
+        moments = {name: (np.zeros_like(getattr(self, name)), np.zeros_like(getattr(self, name))) for name in params}
+        rng = np.random.default_rng(seed)
+        step = 0
+        for _ in range(epochs):
+            order = rng.permutation(len(x))
+            for start in range(0, len(x), batch):
+                index = order[start:start + batch]
+                xb, yb = x[index], y[index]
+                out, h = self.forward(xb)
+                pred = np.tanh(out)
+                grad_out = 2 * (pred - yb) * (1 - pred ** 2) / len(index)
+                grads = {'b2': grad_out.sum()}
+                if self.hidden:
+                    grads['w2'] = h.T @ grad_out + l2 * self.w2
+                    grad_h = np.outer(grad_out, self.w2) * (h > 0)
+                    grads['w1'] = xb.T @ grad_h + l2 * self.w1
+                    grads['b1'] = grad_h.sum(axis=0)
+                else:
+                    grads['w2'] = xb.T @ grad_out + l2 * self.w2
+                step += 1
+                for name in params:
+                    m, v = moments[name]
+                    m = 0.9 * m + 0.1 * grads[name]
+                    v = 0.999 * v + 0.001 * grads[name] ** 2
+                    moments[name] = (m, v)
+                    update = rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+                    setattr(self, name, (getattr(self, name) - update).astype(np.float32))
+        return float(np.mean((self.predict(codes) - y) ** 2))
+
+    def save(self, path):
+        weights = {'hidden': self.hidden, 'w2': self.w2, 'b2': self.b2}
+        if self.hidden:
+            weights.update(w1=self.w1, b1=self.b1)
+        np.savez(path, **weights)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        model = cls(int(data['hidden']))
+        for name in ('w1', 'b1', 'w2', 'b2'):
+            if name in data:
+                setattr(model, name, data[name].astype(np.float32))
+        return model
+
+
+def apply_move_codes(codes, move, color):
+    # our move played in every state at once, straight on the piece codes; states where a piece blocks a
+    # sliding move keep their codes, which is close to what RBC's move revision does to a blocked move
+    after = codes.copy()
+    between = list(chess.SquareSet(chess.between(move.from_square, move.to_square)))
+    moved = (codes[:, move.from_square] != 0)
+    if between:
+        moved &= (codes[:, between] == 0).all(axis=1)
+    rows = np.flatnonzero(moved)
+    piece = codes[rows, move.from_square]
+    if move.promotion:
+        piece = np.full(len(rows), move.promotion if color == chess.WHITE else move.promotion + 6, dtype=codes.dtype)
+    after[rows, move.to_square] = piece
+    after[rows, move.from_square] = 0
+    king = chess.KING if color == chess.WHITE else chess.KING + 6
+    if abs(move.to_square - move.from_square) == 2 and move.from_square in (chess.E1, chess.E8):
+        # castling also moves the rook next to the king
+        castles = rows[piece == king]
+        rook_from = move.to_square + 1 if move.to_square > move.from_square else move.to_square - 2
+        rook_to = (move.from_square + move.to_square) // 2
+        after[castles, rook_to] = codes[castles, rook_from]
+        after[castles, rook_from] = 0
+    return after
+
+
+def score_moves(evaluator, codes, moves, color, weights=None):
+    # weighted mean learned score of each move over the belief set
+    weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)
+    return {move: float(evaluator.score(apply_move_codes(codes, move, color), color) @ weights / weights.sum())
+            for move in moves}
+
+
+def load_shards(paths):
+    boards, turns, outcomes = [], [], []
+    for path in paths:
+        data = np.load(path)
+        winner = dict(zip(data['game_id'], data['winner']))
+        boards.append(data['board'])
+        turns.append(data['color'])
+        outcomes.append(np.array([{1: 1.0, 0: -1.0}.get(int(winner[game]), 0.0) for game in data['game']],
+                                 dtype=np.float32))
+    return np.concatenate(boards), np.concatenate(turns), np.concatenate(outcomes)
+
+
+def shard_records(boards, turns):
+    # shards keep placement and side to move only, so there are no castling or en passant rights
+    records = np.zeros(len(boards), dtype=RECORD)
+    records['board'], records['turn'], records['ep'], records['fullmove'] = boards, turns, NO_EP, 1
+    return records
+
+
+def engine_targets(records, engine, limit):
+    targets = np.zeros(len(records), dtype=np.float32)
+    for i, fen in enumerate(decode_states(records)):
+        board = chess.Board(fen)
+        if not board.is_valid():
+            continue
+        targets[i] = np.tanh(score_value(engine.analyse(board, limit).get('score'), chess.WHITE) / ENGINE_SCALE)
+    return targets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit the NumPy position evaluator on self-play shards.')
+    parser.add_argument('shards', nargs='+', help='selfplay.py .npz files or globs')
+    parser.add_argument('--out', default='evaluator.npz')
+    parser.add_argument('--hidden', type=int, default=0, help='hidden units, 0 for a linear model')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--engine-weight', type=float, default=0.0,
+                        help='share of the target taken from engine scores instead of game outcomes')
+    parser.add_argument('--engine-time', type=float, default=0.01)
+    args = parser.parse_args()
+
+    paths = sorted(path for pattern in args.shards for path in glob.glob(pattern))
+    boards, turns, targets = load_shards(paths)
+    records = shard_records(boards, turns)
+    if args.engine_weight:
+        from engines import open_engine
+        engine = open_engine()
+        try:
+            scores = engine_targets(records, engine, chess.engine.Limit(time=args.engine_time))
+        finally:
+            engine.quit()
+        targets = (1 - args.engine_weight) * targets + args.engine_weight * scores
+
+    model = Evaluator(args.hidden)
+    loss = model.fit(piece_codes(records), targets, epochs=args.epochs)
+    model.save(args.out)
+    print(f'{len(boards)} positions from {len(paths)} shards, mse {loss:.4f}, saved to {args.out}', file=sys.stderr)
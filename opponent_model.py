@@ -0,0 +1,121 @@
+import glob
+import os
+import re
+from collections import Counter
+import chess
+from reconchess import GameHistory
+from belief import parse_board, opponent_moves
+
+# rc_bot_match saves one <white>-<black>-<winner>-<timestamp>.json replay per game
+REPLAY_NAME = re.compile(r'(?P<white>[^-]+)-(?P<black>[^-]+)-(?:white|black|Draw|ERROR)-'
+                         r'\d{4}_\d{2}_\d{2}-\d{2}_\d{2}_\d{2}\.json')
+# per-replay counts keyed by (path, modification time, opponent), so each saved game is parsed once per process
+LEARNED = {}
+
+
+def move_feature(board, move):
+    # coarse move class shared by every position, so a few games are enough to learn the opponent's habits
+    if board.is_castling(move):
+        return 'castle'
+    piece_type = board.piece_type_at(move.from_square)
+    if move.promotion is not None:
+        return f'promote:{move.promotion}'
+    return f'{piece_type}:{"x" if board.is_capture(move) else "-"}'
+
+
+class OpponentModel:
+    # per-move choice rates by move class, learned from past games: how often a move of that class was played
+    # when offered; a random bot ends up uniform, an engine bot heavily favours captures
+    def __init__(self, prior=1.0):
+        self.prior = prior
+        self.chosen = Counter()
+        self.available = Counter()
+        self.games = 0
+
+    def learn(self, history, opponent_name):
+        colors = [color for color, name in ((chess.WHITE, history.get_white_player_name()),
+                                            (chess.BLACK, history.get_black_player_name())) if name == opponent_name]
+        for color in colors:
+            for turn in history.turns(color):
+                move = history.taken_move(turn)
+                if move is None:
+                    continue
+                board = history.truth_board_before_move(turn)
+                self.chosen[move_feature(board, move)] += 1
+                self.available.update(move_feature(board, legal) for legal in board.pseudo_legal_moves)
+        self.games += len(colors)
+        return self
+
+    def rate(self, feature):
+        return (self.chosen[feature] + self.prior) / (self.available[feature] + self.prior)
+
+    def move_probabilities(self, board, moves=None):
+        moves = list(board.pseudo_legal_moves if moves is None else moves)
+        rates = [self.rate(move_feature(board, move)) for move in moves]
+        total = sum(rates)
+        return {move: rate / total for move, rate in zip(moves, rates)}
+
+    def weighted_successors(self, fen, capture_square=None, boards=None):
+        # (fen, probability) for every child consistent with the capture report, normalized over those children
+        board = parse_board(fen, boards)
+        probabilities = self.move_probabilities(board, opponent_moves(board, capture_square))
+        children = []
+        for move, probability in probabilities.items():
+            board.push(move)
+            children.append((board.fen(), probability))
+            board.pop()
+        return children
+
+    def successors(self, fen, capture_square=None, boards=None, threshold=0.0):
+        # drop-in for belief.opponent_move_successors that skips children below `threshold`; the most likely
+        # child always survives so a state is never expanded into nothing by the model alone
+        children = self.weighted_successors(fen, capture_square, boards)
+        if not children:
+            return []
+        top = max(probability for _, probability in children)
+        return sorted(child for child, probability in children if probability >= min(threshold, top))
+
+    def merge(self, other):
+        self.chosen.update(other.chosen)
+        self.available.update(other.available)
+        self.games += other.games
+        return self
+
+    @classmethod
+    def from_file(cls, path, opponent_name):
+        # None for anything that is not a readable GameHistory, e.g. telemetry JSON in the same directory
+        try:
+            history = GameHistory.from_file(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if not isinstance(history, GameHistory):
+            return None
+        return cls().learn(history, opponent_name)
+
+    @classmethod
+    def from_histories(cls, paths, opponent_name, prior=1.0):
+        model = cls(prior)
+        for path in paths:
+            try:
+                key = (path, os.path.getmtime(path), opponent_name)
+            except OSError:
+                continue
+            if key not in LEARNED:
+                LEARNED[key] = cls.from_file(path, opponent_name)
+            if LEARNED[key] is not None:
+                model.merge(LEARNED[key])
+        return model
+
+    @classmethod
+    def from_directory(cls, directory, opponent_name, prior=1.0):
+        return cls.from_histories(replay_paths(directory, opponent_name), opponent_name, prior)
+
+
+def replay_paths(directory, opponent_name):
+    # rc_bot_match replays the opponent played in; other JSON files in the directory are ignored
+    paths = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        match = REPLAY_NAME.fullmatch(os.path.basename(path))
+        if match and opponent_name in (match['white'], match['black']):
+            paths.append(path)
+    return paths
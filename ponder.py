@@ -0,0 +1,93 @@
+import logging
+import threading
+import numpy as np
+from king_danger import state_codes
+from belief import update_belief
+
+# work done on the opponent's clock: between our move result and the next opponent-move report, the belief is
+# expanded for the no-capture case under the agent's cap, sense squares are scored on it and the engine is run
+# on a few of its states; the agent picks the results up once the observation arrives
+
+
+def sense_window(square):
+    file, rank = square % 8, square // 8
+    return [r * 8 + f for r in range(rank - 1, rank + 2) for f in range(file - 1, file + 2)
+            if 0 <= r < 8 and 0 <= f < 8]
+
+
+def expected_remaining(codes, squares, stop_event=None):
+    # expected number of states left after sensing each square: sum over outcomes of size^2 / N; a set
+    # stop_event ends the scan early with the squares scored so far
+    scores = {}
+    for square in squares:
+        if stop_event is not None and stop_event.is_set():
+            break
+        _, counts = np.unique(codes[:, sense_window(square)], axis=0, return_counts=True)
+        scores[square] = float((counts.astype(np.float64) ** 2).sum() / len(codes))
+    return scores
+
+
+def expected_disagreement(codes, moves, squares):
+    # share of states whose own best move differs from the majority move of their sense outcome; 0 means
+    # every outcome of the square settles which move we play, whatever else stays unknown
+    _, choice = np.unique(moves, return_inverse=True)
+    choice = choice.ravel()
+    scores = {}
+    for square in squares:
+        _, outcome = np.unique(codes[:, sense_window(square)], axis=0, return_inverse=True)
+        outcome = outcome.ravel()
+        pairs, counts = np.unique(outcome * (choice.max() + 1) + choice, return_counts=True)
+        majority = np.zeros(outcome.max() + 1, dtype=np.int64)
+        np.maximum.at(majority, pairs // (choice.max() + 1), counts)
+        scores[square] = float(1.0 - majority.sum() / len(codes))
+    return scores
+
+
+class Ponderer:
+    def __init__(self, expand, evaluate, warm_states=50):
+        self.expand = expand
+        self.evaluate = evaluate
+        self.warm_states = warm_states
+        self.belief = None
+        self.sense_scores = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self, states, sense_squares, max_states=10000):
+        self.stop()
+        self.belief = None
+        self.sense_scores = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(list(states), list(sense_squares), max_states, self.stop_event),
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # cancels the worker and waits for the unit of work in flight (one expansion, sense square or engine call)
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def run(self, states, sense_squares, max_states, stop_event):
+        try:
+            # the capped, deduplicated no-capture belief, streamed exactly as the agent would build it; an
+            # expansion cut short by stop() is thrown away rather than handed over incomplete
+            belief = update_belief(states, lambda fen: [] if stop_event.is_set() else self.expand(fen),
+                                   cap=max_states)
+            if stop_event.is_set():
+                return
+            self.belief = belief
+            if belief:
+                sense_scores = expected_remaining(state_codes(belief), sense_squares, stop_event)
+                if stop_event.is_set():
+                    return
+                self.sense_scores = sense_scores
+
+            # the sample is uniform over the belief, so its head is as good a set to warm as any
+            for child in belief[:self.warm_states]:
+                if stop_event.is_set():
+                    return
+                self.evaluate(child)
+        except Exception as e:
+            logging.error(f'Pondering failed: {e}')
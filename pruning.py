@@ -0,0 +1,94 @@
+import heapq
+import math
+import random
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+# kept states (same container type as the input), their scores and weights, and the share of the
+# total weight that was dropped
+PruneResult = namedtuple('PruneResult', ['states', 'scores', 'weights', 'discarded_mass'])
+
+
+def score_likelihoods(scores, temperature=100.0):
+    # softmax over centipawn scores, used when no explicit likelihoods are given
+    top = max(scores)
+    return [math.exp((score - top) / temperature) for score in scores]
+
+
+def select(states, scores, weights, keep):
+    total = sum(weights)
+    kept_mass = sum(weights[i] for i in keep)
+    if isinstance(states, np.ndarray):
+        kept_states = states[np.asarray(keep, dtype=np.int64)]
+    else:
+        kept_states = [states[i] for i in keep]
+    discarded = 1.0 - kept_mass / total if total > 0 else 0.0
+    return PruneResult(kept_states, [scores[i] for i in keep], [weights[i] for i in keep], discarded)
+
+
+def top_k_policy(states, scores, k, weights, rng):
+    # heap selection of the k best scores, O(N log K)
+    return heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+
+
+def largest_remainder(sizes, total):
+    # integer shares of `total` proportional to `sizes` that sum exactly to `total`
+    exact = [total * size / sum(sizes) for size in sizes]
+    shares = [math.floor(share) for share in exact]
+    by_remainder = sorted(range(len(sizes)), key=lambda i: shares[i] - exact[i])
+    for i in by_remainder[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def stratified_policy(states, scores, k, weights, rng, stratum=None):
+    # keeps every stratum represented, best scores first within each one: one state per stratum, the rest of k
+    # shared out in proportion to stratum size. The default strata are material signatures, so
+    # rare-but-possible captures are not all pruned away
+    stratum = stratum or material_signature
+    strata = defaultdict(list)
+    for i, state in enumerate(states):
+        strata[stratum(state)].append(i)
+    strata = list(strata.values())
+
+    if len(strata) >= k:
+        return heapq.nlargest(k, (max(members, key=scores.__getitem__) for members in strata),
+                              key=scores.__getitem__)
+
+    spare = min(k - len(strata), len(states) - len(strata))
+    quotas = largest_remainder([len(members) - 1 for members in strata], spare) if spare else [0] * len(strata)
+    return [i for members, quota in zip(strata, quotas)
+            for i in heapq.nlargest(1 + quota, members, key=scores.__getitem__)]
+
+
+def likelihood_policy(states, scores, k, weights, rng):
+    # weighted sampling without replacement (Efraimidis-Spirakis): the k largest u ** (1 / w) keys
+    keys = ((rng.random() ** (1.0 / weight) if weight > 0 else 0.0, i) for i, weight in enumerate(weights))
+    return [i for _, i in heapq.nlargest(k, keys)]
+
+
+def material_signature(state):
+    # FEN states group by their sorted piece letters; encoded belief_store records by their packed board bytes'
+    # piece counts
+    if isinstance(state, str):
+        return ''.join(sorted(char for char in state.split(' ', 1)[0] if char.isalpha()))
+    packed = np.asarray(state['board'])
+    return tuple(np.bincount(np.concatenate([packed & 0x0F, packed >> 4]), minlength=13))
+
+
+POLICIES = {
+    'top_k': top_k_policy,
+    'stratified': stratified_policy,
+    'likelihood': likelihood_policy,
+}
+
+
+def prune(states, scores, k, policy='top_k', weights=None, rng=random):
+    scores = list(scores)
+    if weights is None:
+        weights = score_likelihoods(scores) if policy == 'likelihood' and scores else [1.0] * len(scores)
+    weights = list(weights)
+    if len(scores) <= k:
+        return PruneResult(states, scores, weights, 0.0)
+    return select(states, scores, weights, POLICIES[policy](states, scores, k, weights, rng))
@@ -0,0 +1,166 @@
+import time
+import chess
+import chess.engine
+import chess.polyglot
+
+MATE = 100000
+PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0,
+}
+CENTER = chess.BB_CENTER
+EXTENDED_CENTER = (chess.BB_FILE_C | chess.BB_FILE_D | chess.BB_FILE_E | chess.BB_FILE_F) & \
+    (chess.BB_RANK_3 | chess.BB_RANK_4 | chess.BB_RANK_5 | chess.BB_RANK_6)
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(board):
+    # material plus a small centralisation bonus, from the side to move's point of view
+    score = 0
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        if not board.kings & board.occupied_co[color]:
+            # RBC is won by taking the king
+            score -= sign * MATE
+            continue
+        for piece_type, value in PIECE_VALUES.items():
+            mask = board.pieces_mask(piece_type, color)
+            score += sign * value * chess.popcount(mask)
+            if piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP):
+                score += sign * (10 * chess.popcount(mask & CENTER) + 5 * chess.popcount(mask & EXTENDED_CENTER))
+    return score if board.turn == chess.WHITE else -score
+
+
+def capture_value(board, move):
+    # MVV-LVA ordering key
+    victim = board.piece_type_at(move.to_square) or chess.PAWN
+    attacker = board.piece_type_at(move.from_square) or chess.PAWN
+    return PIECE_VALUES[victim] * 10 - PIECE_VALUES[attacker]
+
+
+class AlphaBeta:
+    # negamax alpha-beta with a Zobrist-keyed transposition table and a node/time budget
+    def __init__(self, node_limit=None, time_limit=None, table=None):
+        self.node_limit = node_limit
+        self.deadline = time.monotonic() + time_limit if time_limit else None
+        self.table = {} if table is None else table
+        self.nodes = 0
+
+    def tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes % 256 == 0 and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+    def ordered_moves(self, board, best_move=None):
+        moves = list(board.legal_moves)
+        moves.sort(key=lambda move: (move != best_move,
+                                     not board.is_capture(move),
+                                     -capture_value(board, move) if board.is_capture(move) else 0,
+                                     move.promotion is None))
+        return moves
+
+    def quiesce(self, board, alpha, beta):
+        self.tick()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        captures = sorted(board.generate_legal_captures(), key=lambda move: -capture_value(board, move))
+        for move in captures:
+            board.push(move)
+            score = -self.quiesce(board, -beta, -alpha)
+            board.pop()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def negamax(self, board, depth, alpha, beta):
+        self.tick()
+        key = chess.polyglot.zobrist_hash(board)
+        entry = self.table.get(key)
+        best_move = None
+        if entry is not None:
+            entry_depth, entry_score, flag, best_move = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER and entry_score <= alpha:
+                    return entry_score
+
+        if depth == 0:
+            return self.quiesce(board, alpha, beta)
+
+        moves = self.ordered_moves(board, best_move)
+        if not moves:
+            return -MATE if board.is_check() else 0
+
+        original_alpha = alpha
+        best_score = -MATE - 1
+        for move in moves:
+            board.push(move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha)
+            board.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        flag = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.table[key] = (depth, best_score, flag, best_move)
+        return best_score
+
+    def root_scores(self, board, depth, moves):
+        # every root move gets a full-window search, since callers rank all children, not just the best
+        scores = {}
+        for move in moves:
+            board.push(move)
+            scores[move] = -self.negamax(board, depth - 1, -MATE - 1, MATE + 1)
+            board.pop()
+        return scores
+
+
+def score_root_moves(board, depth=3, node_limit=None, time_limit=None, engine=None, engine_limit=None, moves=None):
+    # iterative deepening until `depth` or the budget runs out; the engine, if any, is only asked once at the root.
+    # `moves` restricts the root, e.g. to the moves a capture report allows
+    board = board.copy(stack=False)
+    search = AlphaBeta(node_limit, time_limit)
+    moves = list(board.legal_moves if moves is None else moves)
+
+    scores = {}
+    for move in moves:
+        board.push(move)
+        scores[move] = -evaluate(board)
+        board.pop()
+
+    for current_depth in range(1, depth + 1):
+        moves.sort(key=lambda move: -scores[move])
+        try:
+            scores = search.root_scores(board, current_depth, moves)
+        except SearchTimeout:
+            # unwind whatever the interrupted search left pushed
+            while board.move_stack:
+                board.pop()
+            break
+
+    if engine is not None and moves and board.is_valid():
+        infos = engine.analyse(board, engine_limit or chess.engine.Limit(time=0.1), multipv=len(moves),
+                               root_moves=moves)
+        for info in infos:
+            if info.get('pv') and 'score' in info and info['pv'][0] in scores:
+                scores[info['pv'][0]] = info['score'].pov(board.turn).score(mate_score=MATE)
+
+    return scores
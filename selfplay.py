@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import random
+import argparse
+import traceback
+import itertools
+import multiprocessing
+import chess
+import numpy as np
+from reconchess import LocalGame, load_player
+from reconchess.play import notify_opponent_move_results
+from belief_store import encode_states
+
+# Headless self-play: every ordered pair of the given players is played `--games` times in a process pool,
+# each game with its own fixed seed, and one record per turn is written to columnar .npz shards
+# (<out>-00000.npz, ...). Moves are stored as from + 64 * to + 4096 * promotion, NO_MOVE for none;
+# the true board uses the packed piece codes of belief_store.
+# Agents iterate sets of FEN strings, whose order follows Python's per-process string hash, so the script
+# re-executes itself with PYTHONHASHSEED pinned to --seed; runs are only reproducible through this entry point,
+# and only for games that do not end on the clock, since thinking time depends on machine load.
+
+NO_MOVE = 65535
+NO_SQUARE = -1
+TURN_COLUMNS = {
+    'game': np.uint32,
+    'turn': np.uint16,
+    'color': np.uint8,
+    'belief_before_sense': np.int32,
+    'belief_after_sense': np.int32,
+    'sense': np.int8,
+    'requested_move': np.uint16,
+    'taken_move': np.uint16,
+    'capture_square': np.int8,
+    'sense_seconds': np.float32,
+    'move_seconds': np.float32,
+}
+GAME_COLUMNS = {
+    'game_id': np.uint32,
+    'seed': np.uint32,
+    'white': 'U64',
+    'black': 'U64',
+    'winner': np.int8,  # 1 white, 0 black, -1 draw or no result
+    'turns': np.uint16,
+    'error': 'U256',  # exception that ended the game early, empty for games played out
+}
+
+
+def move_code(move):
+    if move is None:
+        return NO_MOVE
+    return move.from_square + 64 * move.to_square + 4096 * (move.promotion or 0)
+
+
+def decode_move(code):
+    if code == NO_MOVE:
+        return None
+    return chess.Move(code % 64, code // 64 % 64, code // 4096 or None)
+
+
+def belief_size(player):
+    states = getattr(player, 'possible_states', None)
+    return -1 if states is None else len(states)
+
+
+def play_game(job):
+    game_id, white_path, black_path, seed, seconds_per_player = job
+    random.seed(seed)
+    np.random.seed(seed)
+
+    players = [load_player(black_path)[1](), load_player(white_path)[1]()]
+    names = [player.__class__.__name__ for player in players]
+    game = LocalGame(seconds_per_player=seconds_per_player)
+    game.store_players(names[chess.WHITE], names[chess.BLACK])
+    players[chess.WHITE].handle_game_start(chess.WHITE, game.board.copy(), names[chess.BLACK])
+    players[chess.BLACK].handle_game_start(chess.BLACK, game.board.copy(), names[chess.WHITE])
+    game.start()
+
+    rows = {column: [] for column in TURN_COLUMNS}
+    boards = []
+    turn = 0
+    while not game.is_over():
+        color = game.turn
+        player = players[color]
+        boards.append(game.board.fen())
+        sense_actions = game.sense_actions()
+        move_actions = game.move_actions()
+        notify_opponent_move_results(game, player)
+
+        before = belief_size(player)
+        start = time.perf_counter()
+        sense = player.choose_sense(sense_actions, move_actions, game.get_seconds_left())
+        player.handle_sense_result(game.sense(sense))
+        sensed = time.perf_counter()
+        after = belief_size(player)
+
+        move = player.choose_move(move_actions, game.get_seconds_left())
+        requested_move, taken_move, capture_square = game.move(move)
+        player.handle_move_result(requested_move, taken_move, capture_square is not None, capture_square)
+        game.end_turn()
+        moved = time.perf_counter()
+
+        for column, value in (('game', game_id), ('turn', turn), ('color', color),
+                              ('belief_before_sense', before), ('belief_after_sense', after),
+                              ('sense', NO_SQUARE if sense is None else sense),
+                              ('requested_move', move_code(requested_move)), ('taken_move', move_code(taken_move)),
+                              ('capture_square', NO_SQUARE if capture_square is None else capture_square),
+                              ('sense_seconds', sensed - start), ('move_seconds', moved - sensed)):
+            rows[column].append(value)
+        turn += 1
+
+    game.end()
+    winner_color = game.get_winner_color()
+    history = game.get_game_history()
+    for player in players[::-1]:
+        player.handle_game_end(winner_color, game.get_win_reason(), history)
+
+    columns = {column: np.array(values, dtype=TURN_COLUMNS[column]) for column, values in rows.items()}
+    columns['board'] = encode_states(boards)['board']
+    summary = {'game_id': game_id, 'seed': seed, 'white': names[chess.WHITE], 'black': names[chess.BLACK],
+               'winner': -1 if winner_color is None else int(winner_color), 'turns': turn, 'error': ''}
+    return columns, summary
+
+
+def play_game_or_fail(job):
+    # an agent that raises costs only its own game: it is kept in the game table with its error and no turns
+    try:
+        return play_game(job)
+    except Exception as e:
+        game_id, white_path, black_path, seed, _ = job
+        print(f'game {game_id} failed:\n{traceback.format_exc()}', file=sys.stderr)
+        columns = {column: np.array([], dtype=dtype) for column, dtype in TURN_COLUMNS.items()}
+        columns['board'] = encode_states([])['board']
+        summary = {'game_id': game_id, 'seed': seed, 'white': white_path, 'black': black_path, 'winner': -1,
+                   'turns': 0, 'error': f'{type(e).__name__}: {e}'[:256]}
+        return columns, summary
+
+
+def write_shard(path, results):
+    columns = {column: np.concatenate([result[0][column] for result in results]) for column in results[0][0]}
+    for column, dtype in GAME_COLUMNS.items():
+        columns[column] = np.array([result[1][column] for result in results], dtype=dtype)
+    np.savez_compressed(path, **columns)
+
+
+def jobs(players, games, seed, seconds_per_player):
+    game_id = 0
+    for white, black in itertools.permutations(players, 2):
+        for _ in range(games):
+            yield game_id, white, black, seed + game_id, seconds_per_player
+            game_id += 1
+
+
+def run(players, games, out, workers=None, seed=0, seconds_per_player=900, shard_size=100):
+    shard = []
+    shards = 0
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(play_game_or_fail, jobs(players, games, seed, seconds_per_player)):
+            shard.append(result)
+            print(f"game {result[1]['game_id']}: {result[1]['white']} vs {result[1]['black']}, "
+                  f"{result[1]['turns']} turns{' (failed)' if result[1]['error'] else ''}", file=sys.stderr)
+            if len(shard) == shard_size:
+                write_shard(f'{out}-{shards:05d}.npz', shard)
+                shard, shards = [], shards + 1
+    if shard:
+        write_shard(f'{out}-{shards:05d}.npz', shard)
+        shards += 1
+    return shards
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play agents against each other and log every turn.')
+    parser.add_argument('players', nargs='+', help='bot files or modules, as for rc_bot_match')
+    parser.add_argument('--games', type=int, default=1, help='games per ordered pair')
+    parser.add_argument('--out', default='selfplay', help='shard path prefix')
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to the number of cores')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seconds', type=float, default=900, help='clock per player')
+    parser.add_argument('--shard-size', type=int, default=100, help='games per output file')
+    args = parser.parse_args()
+
+    if os.environ.get('PYTHONHASHSEED') != str(args.seed):
+        os.execve(sys.executable, [sys.executable] + sys.argv, dict(os.environ, PYTHONHASHSEED=str(args.seed)))
+    if len(args.players) < 2:
+        parser.error('need at least two players')
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    run(args.players, args.games, args.out, args.workers, args.seed, args.seconds, args.shard_size)
@@ -0,0 +1,96 @@
+import sys
+import time
+import zlib
+import argparse
+import chess
+from search import evaluate
+
+# Stand-in UCI engine for running agents without Stockfish, e.g.
+#   RBC_ENGINE="python stub_engine.py --latency 0.01" python -m reconchess.scripts.rc_bot_match ...
+# Moves and scores are a deterministic function of the position: one ply of search.evaluate, ties broken by a
+# CRC of the move, so two runs over the same positions give the same answers. --latency sleeps before every
+# reply to `go`, capped by movetime when the GUI sends one.
+
+
+def ranked_moves(board, searchmoves=None):
+    moves = [move for move in board.legal_moves if searchmoves is None or move in searchmoves]
+    scored = []
+    for move in moves:
+        board.push(move)
+        scored.append((-evaluate(board), zlib.crc32(move.uci().encode()), move))
+        board.pop()
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(move, score) for score, _, move in scored]
+
+
+def parse_position(tokens):
+    if tokens[0] == 'startpos':
+        board, rest = chess.Board(), tokens[1:]
+    else:
+        board, rest = chess.Board(' '.join(tokens[1:7])), tokens[7:]
+    if rest and rest[0] == 'moves':
+        for uci in rest[1:]:
+            board.push_uci(uci)
+    return board
+
+
+def parse_go(tokens):
+    options = {}
+    searchmoves = None
+    for i, token in enumerate(tokens):
+        if token == 'searchmoves':
+            searchmoves = []
+            for uci in tokens[i + 1:]:
+                try:
+                    searchmoves.append(chess.Move.from_uci(uci))
+                except ValueError:
+                    break
+        elif token in ('movetime', 'depth', 'nodes', 'wtime', 'btime') and i + 1 < len(tokens):
+            options[token] = int(tokens[i + 1])
+    return options, searchmoves
+
+
+def run(lines, out, latency=0.0):
+    board = chess.Board()
+    multipv = 1
+
+    def send(text):
+        out.write(text + '\n')
+        out.flush()
+
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == 'uci':
+            send('id name StubEngine')
+            send('id author AI-RBC')
+            send('option name MultiPV type spin default 1 min 1 max 500')
+            send('uciok')
+        elif command == 'isready':
+            send('readyok')
+        elif command == 'setoption' and 'name' in tokens and 'value' in tokens:
+            name = ' '.join(tokens[tokens.index('name') + 1:tokens.index('value')])
+            if name.lower() == 'multipv':
+                multipv = max(1, int(tokens[tokens.index('value') + 1]))
+        elif command == 'position':
+            board = parse_position(tokens[1:])
+        elif command == 'go':
+            options, searchmoves = parse_go(tokens[1:])
+            delay = latency if 'movetime' not in options else min(latency, options['movetime'] / 1000)
+            if delay:
+                time.sleep(delay)
+            ranked = ranked_moves(board, searchmoves)
+            for k, (move, score) in enumerate(ranked[:multipv], 1):
+                send(f'info depth 1 seldepth 1 multipv {k} score cp {score} nodes {len(ranked)} pv {move.uci()}')
+            send(f'bestmove {ranked[0][0].uci()}' if ranked else 'bestmove (none)')
+        elif command == 'quit':
+            return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deterministic stand-in UCI engine.')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering go')
+    args = parser.parse_args()
+    run(sys.stdin, sys.stdout, args.latency)
@@ -0,0 +1,82 @@
+import json
+import random
+import sys
+import time
+import tracemalloc
+try:
+    import resource
+except ImportError:  # POSIX only; Windows gets no rss figures
+    resource = None
+
+# per-turn belief-size and memory records, exported as one JSON file per game; rss is the process peak so far,
+# in bytes (ru_maxrss is kilobytes on Linux and bytes on macOS), None where the resource module is missing
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def bytes_per_state(states, sample=1000):
+    # string size plus the container's pointer, estimated on a sample so huge beliefs stay cheap to measure
+    states = list(states) if not isinstance(states, (list, tuple)) else states
+    if not states:
+        return 0
+    picked = states if len(states) <= sample else random.sample(states, sample)
+    return sum(sys.getsizeof(state) for state in picked) / len(picked) + 8
+
+
+class BeliefTelemetry:
+    def __init__(self, trace=False, top=10):
+        self.trace = trace
+        self.top = top
+        self.turns = []
+        self.meta = {}
+
+    def start_game(self, **meta):
+        self.turns = []
+        self.meta = dict(meta, started=time.time())
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_turn(self):
+        self.finish_turn()
+        self.turns.append({'turn': len(self.turns), 'stages': []})
+
+    def record(self, stage, states):
+        if not self.turns:
+            self.start_turn()
+        self.turns[-1]['stages'].append({
+            'stage': stage,
+            'states': len(states),
+            'bytes_per_state': bytes_per_state(states),
+            'peak_rss': peak_rss(),
+            'time': time.time(),
+        })
+
+    def finish_turn(self):
+        # top allocation sites of the turn that just ended, only when tracemalloc is on
+        if not self.turns or 'allocations' in self.turns[-1] or not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+        self.turns[-1]['allocations'] = {
+            'current': current,
+            'peak': peak,
+            'top': [{'site': str(stat.traceback[0]), 'size': stat.size, 'count': stat.count} for stat in statistics],
+        }
+        tracemalloc.reset_peak()
+
+    def summary(self):
+        stages = [stage for turn in self.turns for stage in turn['stages']]
+        largest = max(stages, key=lambda stage: stage['states'], default=None)
+        return {'turns': len(self.turns), 'largest': largest, 'peak_rss': peak_rss()}
+
+    def export(self, path):
+        self.finish_turn()
+        with open(path, 'w') as f:
+            json.dump({'meta': self.meta, 'summary': self.summary(), 'turns': self.turns}, f, indent=1)
+        if self.trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -2,6 +2,7 @@ import chess.engine
 import random
 from reconchess import *
 import os
+from engines import open_engine
 
 class TroutBot(Player):
 
@@ -9,7 +10,7 @@ class TroutBot(Player):
         self.board = None
         self.color = None
         self.my_piece_captured_square = None
-        self.engine = chess.engine.SimpleEngine.popen_uci('./opt/stockfish/stockfish', setpgrp=True)
+        self.engine = open_engine()
 
     def handle_game_start(self, color: Color, board: chess.Board, opponent_name: str):
         self.board = board